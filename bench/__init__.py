@@ -0,0 +1 @@
+"""Offline benchmark suite: fake Google Sheets, fake Bot API and a load driver."""
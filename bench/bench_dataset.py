@@ -0,0 +1,77 @@
+"""Compare the old DataFrame path with the column-pruned Dataset path.
+
+Usage (from the repository root):
+
+    python -m bench.bench_dataset --rows 100000
+
+Reports, per path, the JSON payload size the Sheets API would send, the
+time to parse that payload into analysis data and the memory the parsed
+data keeps alive.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from bench.fake_sheets import FakeWorksheet, synthetic_history
+from common.dataset import DATA_RANGE, Dataset
+
+
+def old_path(sheet):
+    """What get_dataframe did before: every column as dicts, then pandas parsing"""
+    records = sheet.get_all_records()
+    df = pd.DataFrame(records)
+    df['Tanggal'] = pd.to_datetime(df['Tanggal'], format='%d/%m/%Y', errors='coerce')
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'], format='%d/%m/%Y %H:%M:%S', errors='coerce')
+    df = df.dropna(subset=['Tanggal', 'Timestamp'])
+    df = df.sort_values('Tanggal', ascending=False)
+    df['Result'] = df['Result'].astype(str)
+    # The record cache kept the dicts alive next to the DataFrame
+    return records, df
+
+
+def new_path(sheet):
+    return Dataset.from_values(sheet.get_values(DATA_RANGE))
+
+
+def measure(label, func, sheet, payload):
+    gc.collect()
+    start = time.perf_counter()
+    func(sheet)
+    elapsed = time.perf_counter() - start
+
+    # Memory in a second run, tracemalloc would distort the timing above
+    gc.collect()
+    tracemalloc.start()
+    result = func(sheet)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} payload {len(payload) / 1024 / 1024:>7.2f} MB   parse {elapsed * 1000:>8.1f} ms   "
+          f"retained {retained / 1024 / 1024:>7.2f} MB   peak {peak / 1024 / 1024:>7.2f} MB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Old DataFrame vs column-pruned Dataset')
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    sheet = FakeWorksheet(rows=synthetic_history(args.rows))
+    # Response bodies as the Sheets API would send them for each read
+    old_payload = json.dumps({'values': sheet.rows}).encode()
+    new_payload = json.dumps({'values': sheet.get_values(DATA_RANGE)}).encode()
+
+    print(f"{args.rows:,} rows")
+    measure('dataframe', old_path, sheet, old_payload)
+    measure('dataset', new_path, sheet, new_payload)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import re
+import time
+from urllib.parse import parse_qs
+
+from common.shared_request import SharedHTTPXRequest
+
+BOT_USER = {'id': 1000, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+
+class FakeBotAPI:
+    """Minimal local Bot API server speaking HTTP/1.1 with keep-alive.
+
+    It answers the methods the bots use and calls ``on_reply(chat_id, method)``
+    for every message sent to a chat so the driver can measure end-to-end
+    latency. ``latency`` adds a fixed delay to every response.
+    """
+
+    def __init__(self, latency=0.0, on_reply=None):
+        self.latency = latency
+        self.on_reply = on_reply
+        self.calls = {}
+        self.bytes_received = 0
+        self.server = None
+        self.port = None
+        self._message_id = 0
+
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', '0')))
+                self.bytes_received += len(body)
+
+                result = await self._dispatch(path.rsplit('/', 1)[-1], headers.get('content-type', ''), body)
+                payload = json.dumps({'ok': True, 'result': result}).encode()
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    b'Content-Length: ' + str(len(payload)).encode() + b'\r\n\r\n' + payload
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, content_type, body):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == 'getMe':
+            return BOT_USER
+        if method in ('deleteWebhook', 'setMyCommands'):
+            return True
+        if method == 'getUpdates':
+            return []
+
+        params = self._parse_params(content_type, body)
+        if method == 'answerInlineQuery':
+            # The driver uses "<user id>:<n>" as inline query ids
+            if self.on_reply:
+                self.on_reply(int(str(params['inline_query_id']).split(':')[0]), method)
+            return True
+        chat_id = int(params.get('chat_id', 0) or 0)
+        self._message_id += 1
+        message = {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if method == 'sendMessage':
+            message['text'] = params.get('text', '')
+        elif method == 'sendDocument':
+            message['document'] = {'file_id': f'doc{self._message_id}', 'file_unique_id': f'udoc{self._message_id}'}
+        elif method == 'sendPhoto':
+            message['photo'] = [{
+                'file_id': f'photo{self._message_id}', 'file_unique_id': f'uphoto{self._message_id}',
+                'width': 800, 'height': 600,
+            }]
+        if self.on_reply:
+            self.on_reply(chat_id, method)
+        return message
+
+    @staticmethod
+    def _parse_params(content_type, body):
+        if content_type.startswith('multipart/form-data'):
+            # Only the plain fields are needed; uploaded files are just counted
+            fields = re.findall(rb'name="([^"]+)"\r\n\r\n([^\r]*)\r\n', body)
+            return {key.decode(): value.decode('utf-8', 'replace') for key, value in fields}
+        params = {key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()}
+        # PTB json-encodes every parameter value
+        for key, value in params.items():
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                pass
+        return params
+
+
+class LocalBotAPIRequest(SharedHTTPXRequest):
+    """SharedHTTPXRequest that sends Bot API calls to a local server instead of Telegram"""
+
+    def __init__(self, base_url, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.local_base_url = base_url
+
+    async def do_request(self, url, method, *args, **kwargs):
+        url = re.sub(r'^https://api\.telegram\.org', self.local_base_url, url)
+        return await super().do_request(url, method, *args, **kwargs)
@@ -0,0 +1,171 @@
+import random
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import numericise_all
+
+HEADERS = ['Timestamp', 'Tanggal', 'Periode', 'Result', 'User']
+
+
+def synthetic_history(rows, users=50, seed=1):
+    """Generate ``rows`` records shaped like the ones bot1 writes"""
+    rng = random.Random(seed)
+    start = date(2000, 1, 1)
+    history = []
+    for i in range(rows):
+        day = start + timedelta(days=i // 4)
+        stamp = datetime(day.year, day.month, day.day, 8 + i % 4 * 3, rng.randrange(60), rng.randrange(60))
+        history.append([
+            stamp.strftime('%d/%m/%Y %H:%M:%S'),
+            day.strftime('%d/%m/%Y'),
+            f'{i % 10000:04d}',
+            f'{rng.randrange(10000):04d}',
+            f'user{rng.randrange(users)}',
+        ])
+    return history
+
+
+def column_index(letters):
+    """Zero-based index of an A1 column name"""
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+class FakeWorksheet:
+    """In-process stand-in for ``gspread.Worksheet``.
+
+    Values are stored as strings like the Sheets API returns them. Every
+    call sleeps ``latency`` seconds plus ``latency_per_1k_rows`` for each
+    thousand rows it transfers, and is counted in ``calls``.
+    """
+
+    def __init__(self, title='Sheet1', rows=None, latency=0.0, latency_per_1k_rows=0.0):
+        self.title = title
+        self.rows = [list(HEADERS)] + [list(row) for row in (rows or [])]
+        self.latency = latency
+        self.latency_per_1k_rows = latency_per_1k_rows
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _call(self, name, transferred_rows=1):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        delay = self.latency + self.latency_per_1k_rows * transferred_rows / 1000
+        if delay:
+            time.sleep(delay)
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    def row_values(self, row):
+        self._call('row_values')
+        return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def get_all_values(self):
+        self._call('get_all_values', len(self.rows))
+        return [list(row) for row in self.rows]
+
+    def get_values(self, range_name=None, **kwargs):
+        """Return formatted values of an A1 range such as ``B2:E`` or ``A1:C10``"""
+        if range_name is None:
+            return self.get_all_values()
+        match = re.fullmatch(r'([A-Z]+)(\d*):([A-Z]+)(\d*)', range_name.split('!')[-1])
+        first_col, first_row, last_col, last_row = match.groups()
+        start = int(first_row or 1) - 1
+        stop = int(last_row) if last_row else len(self.rows)
+        left, right = column_index(first_col), column_index(last_col) + 1
+        values = [row[left:right] for row in self.rows[start:stop]]
+        self._call('get_values', len(values) * (right - left) / len(HEADERS))
+        return values
+
+    def get_all_records(self):
+        self._call('get_all_records', len(self.rows))
+        headers = self.rows[0]
+        return [dict(zip(headers, numericise_all(row))) for row in self.rows[1:]]
+
+    def append_row(self, values, **kwargs):
+        self._call('append_row')
+        with self._lock:
+            self.rows.append([str(value) for value in values])
+
+    def clear(self):
+        self._call('clear')
+        with self._lock:
+            self.rows = []
+
+    def update(self, values, range_name=None, **kwargs):
+        """Overwrite the cells starting at the top-left cell of ``range_name``"""
+        self._call('update', len(values))
+        self._write(values, range_name or 'A1')
+
+    def batch_update(self, data, **kwargs):
+        self._call('batch_update', sum(len(item['values']) for item in data))
+        for item in data:
+            self._write(item['values'], item['range'])
+
+    def _write(self, values, range_name):
+        match = re.match(r'([A-Z]+)(\d+)', range_name.split('!')[-1])
+        left, top = column_index(match.group(1)), int(match.group(2)) - 1
+        with self._lock:
+            while len(self.rows) < top + len(values):
+                self.rows.append([])
+            for offset, row in enumerate(values):
+                target = self.rows[top + offset]
+                target.extend([''] * (left + len(row) - len(target)))
+                target[left:left + len(row)] = [str(value) for value in row]
+
+    def update_title(self, title):
+        self._call('update_title')
+        self.title = title
+
+
+class FakeSpreadsheet:
+    def __init__(self, worksheets):
+        self._worksheets = list(worksheets)
+        self.calls = {}
+
+    def _call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        latency = self._worksheets[0].latency if self._worksheets else 0.0
+        if latency:
+            time.sleep(latency)
+
+    def worksheet(self, title):
+        # Looked up by current title so update_title() behaves like the real API
+        for sheet in self._worksheets:
+            if sheet.title == title:
+                return sheet
+        raise WorksheetNotFound(title)
+
+    def worksheets(self):
+        return list(self._worksheets)
+
+    def batch_update(self, body):
+        """Supports the ``addSheet`` requests used to create shards"""
+        self._call('batch_update')
+        for request in body['requests']:
+            properties = request['addSheet']['properties']
+            sheet = FakeWorksheet(properties['title'], latency=self._worksheets[0].latency if self._worksheets else 0.0)
+            sheet.rows = []
+            self._worksheets.append(sheet)
+
+    def values_batch_update(self, body):
+        self._call('values_batch_update')
+        for item in body['data']:
+            title, cell = item['range'].rsplit('!', 1)
+            self.worksheet(title.strip("'"))._write(item['values'], cell)
+
+
+class FakeClient:
+    """Stand-in for an authorised ``gspread.Client`` holding one spreadsheet"""
+
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open_by_key(self, key):
+        return self.spreadsheet
@@ -0,0 +1,260 @@
+"""Drive DataInputBot and TogelAnalysisBot handlers fully offline.
+
+Usage (from the repository root):
+
+    python -m bench.run_bench --bot bot2 --rows 1000,100000 --users 20 --requests 200
+
+Each run builds a fake worksheet with synthetic history, starts a local fake
+Bot API server, feeds command updates from concurrent simulated users into
+the bot's Application and measures the time until each reply reaches the
+fake server. With ``--single-process`` the selected bots run together on
+one fake worksheet and one HTTP pool, as ``main.py --single-process`` runs
+them, each getting ``--requests`` requests from its own ``--users`` users.
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Update
+
+from bench.fake_botapi import FakeBotAPI, LocalBotAPIRequest
+from bench.fake_sheets import FakeClient, FakeSpreadsheet, FakeWorksheet, synthetic_history
+from common.procstats import read_process_stats
+from common.shards import get_history
+from common.sheets import get_client, register_client
+from main import BOTS_CONFIG, BotManager
+
+# Weighted command mix per bot; 'direct' is bot1's "tanggal, periode, result" input
+COMMAND_MIX = {
+    'bot1': [('/start', 1), ('/showdata', 3), ('direct', 2)],
+    'bot2': [('/start', 1), ('/analisis', 3), ('/prediksi', 3), ('/grafik', 1), ('inline', 3)],
+}
+
+# Queries typed after @bot for the 'inline' command
+INLINE_QUERIES = ['prediksi', 'analisis', 'analisis 100', '']
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def rss_mb():
+    return read_process_stats(os.getpid())['rss_bytes'] / 1024 / 1024
+
+
+def sheet_calls(spreadsheet):
+    """Calls per operation summed over every worksheet (shards included)"""
+    calls = dict(spreadsheet.calls)
+    for worksheet in spreadsheet.worksheets():
+        for name, count in worksheet.calls.items():
+            calls[name] = calls.get(name, 0) + count
+    return calls
+
+
+def make_update(update_id, user_id, text):
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench', 'username': f'user{user_id % 1000}'},
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+def make_inline_update(update_id, user_id, query):
+    inline_query = {
+        'id': f'{user_id}:{update_id}',
+        'from': {'id': user_id, 'is_bot': False, 'first_name': 'Bench', 'username': f'user{user_id % 1000}'},
+        'query': query,
+        'offset': '',
+    }
+    return {'update_id': update_id, 'inline_query': inline_query}
+
+
+async def run_once(bot_names, rows, users, requests, sheet_latency, api_latency, run_id, update_concurrency=16,
+                   shard_by=''):
+    """Run one load test of the bots in ``bot_names`` (sharing this process) and return its measurements"""
+    manager = BotManager()
+    bot_classes = [manager.load_bot_class(bot) for name in bot_names for bot in BOTS_CONFIG if bot['folder'] == name]
+    rss_start = rss_mb()
+
+    # Fake Google Sheets, registered so the bot's get_client() picks it up
+    sheet = FakeWorksheet(rows=synthetic_history(rows, users=users), latency=sheet_latency)
+    credentials_file = f'bench-{run_id}.json'
+    spreadsheet = FakeSpreadsheet([sheet])
+    register_client(credentials_file, FakeClient(spreadsheet))
+    env = {
+        'TELEGRAM_BOT_TOKEN': '123456:BENCH',
+        'GOOGLE_SPREADSHEET_ID': f'bench-{run_id}',
+        'GOOGLE_CREDENTIALS_FILE': credentials_file,
+        'SHEET_NAME': sheet.title,
+        'UPDATE_CONCURRENCY': str(update_concurrency),
+        'SHEET_SHARD_BY': shard_by,
+    }
+    if shard_by:
+        # bot1 moves the history into shards when it starts; do it here so bot2 runs see shards too
+        get_history(get_client(credentials_file), env['GOOGLE_SPREADSHEET_ID'], sheet.title, shard_by).prepare_writer()
+    # Same order as main.py, so bot1 sets the sheet up before bot2 reads it
+    bots = [bot_class(env={**env, 'TELEGRAM_BOT_TOKEN': f'12345{index}:BENCH'})
+            for index, bot_class in enumerate(bot_classes)]
+    rss_loaded = rss_mb()
+
+    # Fake Bot API: resolve the waiting user's future on the first reply
+    waiting = {}
+
+    def on_reply(chat_id, method):
+        future = waiting.pop(chat_id, None)
+        if future and not future.done():
+            future.set_result(time.perf_counter())
+
+    api = await FakeBotAPI(latency=api_latency, on_reply=on_reply).start()
+    request = LocalBotAPIRequest(api.base_url, connection_pool_size=64)
+    applications = [bot.build_application(request=request) for bot in bots]
+    for application in applications:
+        await application.initialize()
+        await application.start()
+
+    loop = asyncio.get_running_loop()
+    rng = random.Random(run_id)
+    # Commands are labelled with their bot when several bots share the run
+    labels = {
+        (index, command): command if len(bot_names) == 1 else f'{bot_name} {command}'
+        for index, bot_name in enumerate(bot_names) for command, _ in COMMAND_MIX[bot_name]
+    }
+    latencies = {label: [] for label in labels.values()}
+    failures = 0
+    update_ids = iter(range(1, 10 ** 9))
+
+    async def send(index, user_id, command):
+        nonlocal failures
+        text = command
+        if command == 'direct':
+            text = f'{rng.randrange(1, 29):02d}/01/2025, {rng.randrange(10000):04d}, {rng.randrange(10000):04d}'
+        future = loop.create_future()
+        waiting[user_id] = future
+        start = time.perf_counter()
+        if command == 'inline':
+            data = make_inline_update(next(update_ids), user_id, rng.choice(INLINE_QUERIES))
+        else:
+            data = make_update(next(update_ids), user_id, text)
+        application = applications[index]
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        try:
+            done = await asyncio.wait_for(future, timeout=120)
+            latencies[labels[(index, command)]].append(done - start)
+        except asyncio.TimeoutError:
+            waiting.pop(user_id, None)
+            failures += 1
+
+    # Warm the record cache once so runs measure steady state
+    for index, command in labels:
+        await send(index, 1, command)
+    for values in latencies.values():
+        values.clear()
+
+    async def simulated_user(index, user_id, count):
+        commands, weights = zip(*COMMAND_MIX[bot_names[index]])
+        for _ in range(count):
+            await send(index, user_id, rng.choices(commands, weights)[0])
+
+    # Every bot gets its own users, so replies of different bots never share a chat
+    per_user = [requests // users + (1 if i < requests % users else 0) for i in range(users)]
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        simulated_user(index, 1000 + index * users + i, count)
+        for index in range(len(bot_names)) for i, count in enumerate(per_user) if count
+    ))
+    elapsed = time.perf_counter() - started
+    rss_end = rss_mb()
+
+    for application in applications:
+        await application.stop()
+        await application.shutdown()
+    await api.stop()
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        'bot': '+'.join(bot_names),
+        'rows': rows,
+        'requests': len(all_latencies),
+        'failures': failures,
+        'throughput': len(all_latencies) / elapsed if elapsed else 0.0,
+        'latencies': latencies,
+        'all': all_latencies,
+        'rss_data_mb': rss_loaded - rss_start,
+        'rss_end_mb': rss_end,
+        'sheet_calls': sheet_calls(spreadsheet),
+        'api_calls': dict(api.calls),
+    }
+
+
+def print_report(result):
+    print(f"\n=== {result['bot']} | {result['rows']:,} rows | {result['requests']} requests "
+          f"| {result['failures']} failures ===")
+    print(f"throughput: {result['throughput']:.1f} req/s   "
+          f"data RSS: +{result['rss_data_mb']:.1f} MB   RSS after run: {result['rss_end_mb']:.1f} MB   "
+          f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    width = max(12, *(len(command) for command in result['latencies']))
+    print(f"{'command':<{width}} {'n':>6} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'maxms':>8}")
+    rows = list(result['latencies'].items()) + [('all', result['all'])]
+    for command, values in rows:
+        print(f"{command:<{width}} {len(values):>6} "
+              f"{percentile(values, 50) * 1000:>8.1f} {percentile(values, 95) * 1000:>8.1f} "
+              f"{percentile(values, 99) * 1000:>8.1f} {max(values or [0]) * 1000:>8.1f}")
+    print(f"sheets calls: {result['sheet_calls']}")
+    print(f"bot api calls: {result['api_calls']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark for the Telegram bots')
+    parser.add_argument('--bot', choices=sorted(COMMAND_MIX), action='append',
+                        help='bot to benchmark (repeatable, default: both)')
+    parser.add_argument('--rows', default='1000,10000',
+                        help='comma-separated history sizes, e.g. 1000,100000,1000000')
+    parser.add_argument('--users', type=int, default=20, help='concurrent simulated users')
+    parser.add_argument('--requests', type=int, default=200, help='requests per run')
+    parser.add_argument('--sheet-latency-ms', type=float, default=0.0, help='latency of every fake Sheets call')
+    parser.add_argument('--update-concurrency', type=int, default=16,
+                        help='UPDATE_CONCURRENCY passed to the bot (1 = sequential)')
+    parser.add_argument('--shard-by', choices=['', 'year', 'month'], default='',
+                        help='SHEET_SHARD_BY passed to the bot (the fake history is migrated on start)')
+    parser.add_argument('--api-latency-ms', type=float, default=0.0, help='latency of every fake Bot API call')
+    parser.add_argument('--single-process', action='store_true',
+                        help='run the selected bots together in one process, as main.py --single-process does')
+    args = parser.parse_args()
+
+    # One INFO line per fake Bot API request would drown the report
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    bot_names = args.bot or sorted(COMMAND_MIX)
+    runs = [bot_names] if args.single_process else [[bot_name] for bot_name in bot_names]
+    run_id = 0
+    for names in runs:
+        for rows in (int(value) for value in args.rows.split(',')):
+            run_id += 1
+            result = asyncio.run(run_once(
+                names, rows, args.users, args.requests,
+                args.sheet_latency_ms / 1000, args.api_latency_ms / 1000, run_id,
+                args.update_concurrency, args.shard_by,
+            ))
+            print_report(result)
+            gc.collect()
+
+
+if __name__ == '__main__':
+    main()
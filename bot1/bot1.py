@@ -1,6 +1,7 @@
+import asyncio
 import logging
 from datetime import datetime
-from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram import InputFile, Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -9,11 +10,19 @@ from telegram.ext import (
     ContextTypes,
     ConversationHandler
 )
-import gspread
-from google.oauth2.service_account import Credentials
 import os
+import sys
 from dotenv import load_dotenv
 
+# Make the shared package in the repository root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.concurrency import KeyedUpdateProcessor, limit_concurrency
+from common.export import FORMATS, write_export
+from common.metrics import metrics, parse_admin_ids, phase, timed_handler
+from common.scheduler import PRIORITY_INTERACTIVE_WRITE, get_scheduler
+from common.shards import get_history
+from common.sheets import get_client
+
 # Load environment variables
 load_dotenv()
 
@@ -28,11 +37,16 @@ logger = logging.getLogger(__name__)
 TANGGAL, PERIODE, RESULT = range(3)
 
 class DataInputBot:
-    def __init__(self):
-        self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        self.spreadsheet_id = os.getenv('GOOGLE_SPREADSHEET_ID')
-        self.credentials_file = os.getenv('GOOGLE_CREDENTIALS_FILE')
-        self.sheet_name = os.getenv('SHEET_NAME', 'Sheet1')  # Default to Sheet1 if not specified
+    def __init__(self, env=None):
+        env = env if env is not None else os.environ
+        self.bot_token = env.get('TELEGRAM_BOT_TOKEN')
+        self.spreadsheet_id = env.get('GOOGLE_SPREADSHEET_ID')
+        self.credentials_file = env.get('GOOGLE_CREDENTIALS_FILE')
+        self.sheet_name = env.get('SHEET_NAME', 'Sheet1')  # Default to Sheet1 if not specified
+        self.shard_by = env.get('SHEET_SHARD_BY', '')  # '', 'year' or 'month'
+        self.update_concurrency = int(env.get('UPDATE_CONCURRENCY', '16'))
+        self.admin_ids = parse_admin_ids(env.get('ADMIN_USER_IDS'))
+        self.slow_handler_ms = float(env.get('SLOW_HANDLER_MS', '0'))
         
         # Initialize Google Sheets
         self.setup_google_sheets()
@@ -40,33 +54,37 @@ class DataInputBot:
     def setup_google_sheets(self):
         """Setup Google Sheets connection"""
         try:
-            scope = [
-                'https://www.googleapis.com/auth/spreadsheets',
-                'https://www.googleapis.com/auth/drive'
-            ]
-            
-            creds = Credentials.from_service_account_file(
-                self.credentials_file, 
-                scopes=scope
-            )
-            
-            self.gc = gspread.authorize(creds)
-            self.sheet = self.gc.open_by_key(self.spreadsheet_id).worksheet(self.sheet_name)
+            # Client and record cache are shared with other bots in this process
+            self.gc = get_client(self.credentials_file)
+            self.history = get_history(self.gc, self.spreadsheet_id, self.sheet_name, shard_by=self.shard_by)
+            if self.history.sharded:
+                # Shards are created with the header; move an old single sheet over once
+                self.history.prepare_writer()
+                return
+            self.records = self.history.records
+            self.sheet = self.history.sheet
             
             # Setup header if not exists
+            scheduler = get_scheduler()
+            header = ['Timestamp', 'Tanggal', 'Periode', 'Result', 'User']
             try:
-                headers = self.sheet.row_values(1)
-                if not headers or headers != ['Timestamp', 'Tanggal', 'Periode', 'Result', 'User']:
-                    self.sheet.clear()
-                    self.sheet.append_row(['Timestamp', 'Tanggal', 'Periode', 'Result', 'User'])
+                headers = scheduler.call('row_values', self.sheet.row_values, 1)
+                if not headers or headers != header:
+                    scheduler.call('clear', self.sheet.clear, kind='write', priority=PRIORITY_INTERACTIVE_WRITE)
+                    scheduler.call('append_row', self.sheet.append_row, header,
+                                   kind='write', priority=PRIORITY_INTERACTIVE_WRITE)
+                    self.records.invalidate()
             except Exception as e:
                 logger.warning(f"Header check failed, creating new: {e}")
-                self.sheet.append_row(['Timestamp', 'Tanggal', 'Periode', 'Result', 'User'])
+                scheduler.call('append_row', self.sheet.append_row, header,
+                               kind='write', priority=PRIORITY_INTERACTIVE_WRITE)
+                self.records.invalidate()
                 
         except Exception as e:
             logger.error(f"Error setting up Google Sheets: {e}")
             raise
             
+    @timed_handler
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start command handler"""
         user = update.effective_user
@@ -76,9 +94,11 @@ class DataInputBot:
             "Bot ini akan membantu Anda menginput data ke spreadsheet.\n\n"
             "Gunakan /input untuk mulai input data baru.\n"
             "Gunakan /showdata untuk melihat data yang sudah diinput.\n"
+            "Gunakan /export untuk mengunduh data sebagai file CSV/XLSX.\n"
             "Gunakan /help untuk melihat perintah yang tersedia."
         )
         
+    @timed_handler
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Help command handler"""
         help_text = """
@@ -87,6 +107,7 @@ class DataInputBot:
 /start - Memulai bot
 /input - Memulai input data baru
 /showdata - Menampilkan semua data yang sudah diinput
+/export - Mengunduh data sebagai file CSV atau XLSX
 /cancel - Membatalkan proses input data
 /help - Menampilkan bantuan ini
 
@@ -101,6 +122,7 @@ class DataInputBot:
 """
         await update.message.reply_text(help_text, parse_mode='Markdown')
         
+    @timed_handler
     async def start_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start data input process"""
         await update.message.reply_text(
@@ -112,6 +134,7 @@ class DataInputBot:
         )
         return TANGGAL
         
+    @timed_handler
     async def get_tanggal(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Get date input"""
         tanggal_text = update.message.text.strip()
@@ -137,6 +160,7 @@ class DataInputBot:
             )
             return TANGGAL
             
+    @timed_handler
     async def get_periode(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Get period input"""
         periode = update.message.text.strip()
@@ -159,6 +183,7 @@ class DataInputBot:
         )
         return RESULT
         
+    @timed_handler
     async def get_result(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Get result input and save to spreadsheet"""
         result = update.message.text.strip()
@@ -188,7 +213,7 @@ class DataInputBot:
                 username
             ]
             
-            self.sheet.append_row(row_data)
+            await self.history.append_row(row_data)
             
             # Send confirmation with the saved data
             confirmation_text = f"""
@@ -203,7 +228,8 @@ class DataInputBot:
 Gunakan /input untuk menambah data baru.
 """
             
-            await update.message.reply_text(confirmation_text, parse_mode='Markdown')
+            with phase('reply_text'):
+                await update.message.reply_text(confirmation_text, parse_mode='Markdown')
             
         except Exception as e:
             logger.error(f"Error saving to spreadsheet: {e}")
@@ -216,6 +242,7 @@ Gunakan /input untuk menambah data baru.
         context.user_data.clear()
         return ConversationHandler.END
         
+    @timed_handler
     async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Cancel the conversation"""
         context.user_data.clear()
@@ -225,11 +252,13 @@ Gunakan /input untuk menambah data baru.
         )
         return ConversationHandler.END
         
+    @timed_handler
+    @limit_concurrency('showdata')
     async def show_data(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Show all data that has been input"""
         try:
             # Get all records from the sheet
-            records = self.sheet.get_all_records()
+            records = await self.history.get_records()
             
             if not records:
                 await update.message.reply_text("📭 Tidak ada data yang tersimpan.")
@@ -247,22 +276,24 @@ Gunakan /input untuk menambah data baru.
                 return
                 
             # Format the data for display
-            message = "📋 *Data yang sudah Anda input:*\n\n"
-            for idx, record in enumerate(user_records, 1):
-                message += (
-                    f"*{idx}. {record['Tanggal']}*\n"
-                    f"   Periode: {record['Periode']}\n"
-                    f"   Result: {record['Result']}\n"
-                    f"   Waktu: {record['Timestamp']}\n\n"
-                )
+            with phase('format'):
+                message = "📋 *Data yang sudah Anda input:*\n\n"
+                for idx, record in enumerate(user_records, 1):
+                    message += (
+                        f"*{idx}. {record['Tanggal']}*\n"
+                        f"   Periode: {record['Periode']}\n"
+                        f"   Result: {record['Result']}\n"
+                        f"   Waktu: {record['Timestamp']}\n\n"
+                    )
                 
             # Split long messages to avoid Telegram message length limit
-            if len(message) > 4000:
-                parts = [message[i:i+4000] for i in range(0, len(message), 4000)]
-                for part in parts:
-                    await update.message.reply_text(part, parse_mode='Markdown')
-            else:
-                await update.message.reply_text(message, parse_mode='Markdown')
+            with phase('reply_text'):
+                if len(message) > 4000:
+                    parts = [message[i:i+4000] for i in range(0, len(message), 4000)]
+                    for part in parts:
+                        await update.message.reply_text(part, parse_mode='Markdown')
+                else:
+                    await update.message.reply_text(message, parse_mode='Markdown')
                 
         except Exception as e:
             logger.error(f"Error showing data: {e}")
@@ -271,10 +302,101 @@ Gunakan /input untuk menambah data baru.
                 "Silakan coba lagi nanti atau hubungi administrator."
             )
         
-    def run(self):
-        """Run the bot"""
-        # Create application
-        application = Application.builder().token(self.bot_token).build()
+    @timed_handler
+    @limit_concurrency('export', default=1)
+    async def export_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Send records as a CSV or XLSX document, optionally filtered by user and date range"""
+        user = update.effective_user
+        username = user.username if user.username else f"{user.first_name} {user.last_name or ''}".strip()
+        
+        file_format, target, first, last = 'csv', username, None, None
+        for arg in context.args or []:
+            name, _, value = arg.partition('=')
+            name = name.lower()
+            if not value and name in FORMATS:
+                file_format = name
+            elif name == 'user' and value:
+                target = None if value.lower() == 'semua' else value.lstrip('@')
+            elif name in ('dari', 'sampai') and value:
+                try:
+                    date = datetime.strptime(value, '%d/%m/%Y').date()
+                except ValueError:
+                    await update.message.reply_text(
+                        f"❌ Format tanggal '{value}' tidak valid! Gunakan DD/MM/YYYY\n"
+                        "Contoh: /export dari=01/01/2025"
+                    )
+                    return
+                if name == 'dari':
+                    first = date
+                else:
+                    last = date
+            elif name == 'pasar':
+                await update.message.reply_text(
+                    "❌ Filter pasar belum tersedia: spreadsheet belum memiliki kolom pasar."
+                )
+                return
+            else:
+                await update.message.reply_text(
+                    "❌ Format: /export [csv|xlsx] [user=nama|semua] [dari=DD/MM/YYYY] [sampai=DD/MM/YYYY]\n"
+                    "Contoh: /export xlsx dari=01/01/2025 sampai=31/03/2025"
+                )
+                return
+        
+        # Other users' data is only for admins, like /showdata only shows your own
+        if target != username and user.id not in self.admin_ids:
+            await update.message.reply_text("❌ Hanya admin yang boleh mengekspor data user lain.")
+            return
+        
+        try:
+            chunks = await self.history.record_chunks(first, last)
+            
+            # The file is written row by row to disk in a worker thread
+            with phase('export_write'):
+                path, count = await asyncio.to_thread(write_export, file_format, chunks, target, first, last)
+            try:
+                if not count:
+                    await update.message.reply_text("📭 Tidak ada data yang cocok dengan filter.")
+                    return
+                
+                filename = f"export_{target or 'semua'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{file_format}"
+                with open(path, 'rb') as handle, phase('reply_document'):
+                    # read_file_handle=False streams the upload from disk
+                    await update.message.reply_document(
+                        document=InputFile(handle, filename=filename, read_file_handle=False),
+                        caption=f"📦 {count} data diekspor",
+                        write_timeout=120,
+                    )
+            finally:
+                os.unlink(path)
+            
+        except ImportError:
+            await update.message.reply_text("❌ Export XLSX membutuhkan paket openpyxl.")
+        except Exception as e:
+            logger.error(f"Error exporting data: {e}")
+            await update.message.reply_text(
+                "❌ Terjadi kesalahan saat mengekspor data.\n"
+                "Silakan coba lagi nanti atau hubungi administrator."
+            )
+        
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show handler latency and Sheets API statistics (admin only)"""
+        if update.effective_user.id not in self.admin_ids:
+            await update.message.reply_text("❌ Perintah ini hanya untuk admin.")
+            return
+            
+        report = metrics.format_report()
+        for i in range(0, len(report), 3900):
+            await update.message.reply_text(f"```\n{report[i:i+3900]}\n```", parse_mode='Markdown')
+        
+    def build_application(self, request=None):
+        """Create the Application with all handlers registered"""
+        builder = Application.builder().token(self.bot_token)
+        if self.update_concurrency > 1:
+            # Concurrent across users, sequential per user so conversations stay consistent
+            builder = builder.concurrent_updates(KeyedUpdateProcessor(self.update_concurrency))
+        if request is not None:
+            builder = builder.request(request)
+        application = builder.build()
         
         # Add conversation handler for data input
         conv_handler = ConversationHandler(
@@ -291,6 +413,8 @@ Gunakan /input untuk menambah data baru.
         application.add_handler(CommandHandler('start', self.start))
         application.add_handler(CommandHandler('help', self.help_command))
         application.add_handler(CommandHandler('showdata', self.show_data))
+        application.add_handler(CommandHandler('export', self.export_command))
+        application.add_handler(CommandHandler('stats', self.stats_command))
         application.add_handler(conv_handler)
         
         # Add handler for direct input (format: tanggal, periode, result)
@@ -298,11 +422,17 @@ Gunakan /input untuk menambah data baru.
             filters.TEXT & ~filters.COMMAND,
             self.handle_direct_input
         ))
+        return application
+        
+    def run(self):
+        """Run the bot"""
+        application = self.build_application()
         
         # Run the bot
         logger.info("🤖 Bot Telegram Data Input sedang berjalan...")
         application.run_polling(allowed_updates=Update.ALL_TYPES)
         
+    @timed_handler
     async def handle_direct_input(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle direct input in format: tanggal, periode, result"""
         text = update.message.text.strip()
@@ -341,7 +471,7 @@ Gunakan /input untuk menambah data baru.
         try:
             timestamp = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
             row_data = [timestamp, tanggal, periode, result, username]
-            self.sheet.append_row(row_data)
+            await self.history.append_row(row_data)
             
             # Send confirmation
             confirmation_text = f"""
@@ -355,7 +485,8 @@ Gunakan /input untuk menambah data baru.
 
 Gunakan /input untuk menambah data baru.
 """
-            await update.message.reply_text(confirmation_text, parse_mode='Markdown')
+            with phase('reply_text'):
+                await update.message.reply_text(confirmation_text, parse_mode='Markdown')
             
         except Exception as e:
             logger.error(f"Error saving direct input: {e}")
@@ -370,4 +501,4 @@ if __name__ == '__main__':
         bot.run()
     except Exception as e:
         logger.error(f"Bot failed to start: {e}")
-        
\ No newline at end of file
+        
\ No newline at end of file
@@ -1,16 +1,22 @@
+import asyncio
 import logging
-from datetime import datetime
-import numpy as np
-import pandas as pd
-from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
-import gspread
-from google.oauth2.service_account import Credentials
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.ext import Application, CommandHandler, ContextTypes, InlineQueryHandler
 import os
+import sys
 from dotenv import load_dotenv
 from collections import Counter
 import random
 
+# Make the shared package in the repository root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.charts import ChartCache, render_heatmap, render_trend
+from common.concurrency import KeyedUpdateProcessor, limit_concurrency
+from common.metrics import metrics, parse_admin_ids, phase, timed_handler
+from common.precompute import PrecomputedResults
+from common.shards import get_history
+from common.sheets import get_client
+
 # Load environment variables
 load_dotenv()
 
@@ -21,12 +27,34 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# /grafik chart types and how many recent rows they cover by default / at most
+CHART_KINDS = {'heatmap': 'Heatmap posisi × angka', 'tren': 'Tren kemunculan angka'}
+CHART_DEFAULT_ROWS = 100
+CHART_MAX_ROWS = 5000
+
+# Rows behind /analisis and /prediksi, and the most an inline "analisis N" may ask for
+ANALYSIS_DEFAULT_ROWS = 30
+PREDICTION_ROWS = 50
+INLINE_MAX_ROWS = 1000
+INLINE_TITLES = {'prediksi': '🎯 Prediksi angka periode berikutnya', 'analisis': '📊 Analisis data terbaru'}
+# Cache time of the "still computing" answer, so Telegram asks again soon
+INLINE_RETRY_CACHE_TIME = 5
+
 class TogelAnalysisBot:
-    def __init__(self):
-        self.bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        self.spreadsheet_id = os.getenv('GOOGLE_SPREADSHEET_ID')
-        self.credentials_file = os.getenv('GOOGLE_CREDENTIALS_FILE')
-        self.sheet_name = os.getenv('SHEET_NAME', 'Sheet1')
+    def __init__(self, env=None):
+        env = env if env is not None else os.environ
+        self.bot_token = env.get('TELEGRAM_BOT_TOKEN')
+        self.spreadsheet_id = env.get('GOOGLE_SPREADSHEET_ID')
+        self.credentials_file = env.get('GOOGLE_CREDENTIALS_FILE')
+        self.sheet_name = env.get('SHEET_NAME', 'Sheet1')
+        self.shard_by = env.get('SHEET_SHARD_BY', '')
+        self.update_concurrency = int(env.get('UPDATE_CONCURRENCY', '16'))
+        self.admin_ids = parse_admin_ids(env.get('ADMIN_USER_IDS'))
+        self.slow_handler_ms = float(env.get('SLOW_HANDLER_MS', '0'))
+        self.charts = ChartCache()
+        self.results = PrecomputedResults()
+        self.inline_cache_time = int(env.get('INLINE_CACHE_TIME', '60'))
+        self.inline_deadline = float(env.get('INLINE_DEADLINE', '2'))
         
         # Initialize Google Sheets
         self.setup_google_sheets()
@@ -34,23 +62,15 @@ class TogelAnalysisBot:
     def setup_google_sheets(self):
         """Setup Google Sheets connection"""
         try:
-            scope = [
-                'https://www.googleapis.com/auth/spreadsheets',
-                'https://www.googleapis.com/auth/drive'
-            ]
-            
-            creds = Credentials.from_service_account_file(
-                self.credentials_file, 
-                scopes=scope
-            )
-            
-            self.gc = gspread.authorize(creds)
-            self.sheet = self.gc.open_by_key(self.spreadsheet_id).worksheet(self.sheet_name)
+            # Client and record cache are shared with other bots in this process
+            self.gc = get_client(self.credentials_file)
+            self.history = get_history(self.gc, self.spreadsheet_id, self.sheet_name, shard_by=self.shard_by)
             
         except Exception as e:
             logger.error(f"Error setting up Google Sheets: {e}")
             raise
     
+    @timed_handler
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start command handler"""
         user = update.effective_user
@@ -63,10 +83,12 @@ class TogelAnalysisBot:
             "/help - Menampilkan bantuan\n"
             "/analisis - Melakukan analisis data terbaru\n"
             "/prediksi - Menampilkan prediksi angka\n"
+            "/grafik - Heatmap dan tren angka dalam bentuk gambar\n"
             "/metode - Menjelaskan metode analisis yang digunakan",
             parse_mode='Markdown'
         )
     
+    @timed_handler
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Help command handler"""
         help_text = """
@@ -77,8 +99,13 @@ class TogelAnalysisBot:
 /help - Menampilkan bantuan ini
 /analisis - Analisis data terbaru dari spreadsheet
 /prediksi - Menampilkan prediksi angka untuk periode berikutnya
+/grafik [heatmap|tren] [jumlah] - Grafik frekuensi angka (default: heatmap, 100 data)
 /metode - Menjelaskan metode analisis yang digunakan
 
+💬 *Mode inline* (di chat mana pun):
+@nama\\_bot prediksi - Kirim prediksi terbaru
+@nama\\_bot analisis [jumlah] - Kirim analisis (default: 30 data)
+
 📈 *Metode Analisis:*
 1. Analisis Frekuensi Angka
 2. Pola Angka Panas/Dingin
@@ -90,6 +117,7 @@ class TogelAnalysisBot:
 """
         await update.message.reply_text(help_text, parse_mode='Markdown')
     
+    @timed_handler
     async def metode_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Explain analysis methods"""
         methods_text = """
@@ -120,79 +148,57 @@ class TogelAnalysisBot:
 """
         await update.message.reply_text(methods_text, parse_mode='Markdown')
     
-    def get_dataframe(self):
-        """Get data from spreadsheet and return as DataFrame"""
+    async def get_dataset(self, limit):
+        """Get the newest ``limit`` rows as a column-pruned dataset, newest first"""
         try:
-            records = self.sheet.get_all_records()
-            if not records:
-                return None
-                
-            df = pd.DataFrame(records)
-            
-            # Convert date strings to datetime objects
-            df['Tanggal'] = pd.to_datetime(df['Tanggal'], format='%d/%m/%Y', errors='coerce')
-            df['Timestamp'] = pd.to_datetime(df['Timestamp'], format='%d/%m/%Y %H:%M:%S', errors='coerce')
-            
-            # Drop rows with invalid dates
-            df = df.dropna(subset=['Tanggal', 'Timestamp'])
-            
-            # Sort by date descending
-            df = df.sort_values('Tanggal', ascending=False)
-            
-            # Ensure Result is treated as string
-            df['Result'] = df['Result'].astype(str)
-            
-            return df
+            return await self.history.recent_dataset(limit)
         
         except Exception as e:
             logger.error(f"Error getting data from spreadsheet: {e}")
             return None
     
-    async def analisis_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Analyze the data"""
-        try:
-            df = self.get_dataframe()
-            if df is None or df.empty:
-                await update.message.reply_text("❌ Tidak ada data yang ditemukan di spreadsheet.")
-                return
-            
-            # Get last 30 records for analysis
-            recent_data = df.head(30)
-            
+    async def build_analysis_text(self, recent_data):
+        """Analysis message for ``recent_data``, None when it has no valid results"""
+        recent_results = recent_data.results()
+        
+        with phase('analysis'):
             # Frequency analysis - perbaikan di sini
             all_numbers = []
-            for result in recent_data['Result']:
+            for result in recent_results:
                 # Pastikan result adalah string dan tidak kosong
                 if isinstance(result, str) and result.strip():
                     all_numbers.extend(list(result.strip()))
-            
+        
             if not all_numbers:
-                await update.message.reply_text("❌ Tidak ada data angka yang valid untuk dianalisis.")
-                return
-            
+                return None
+        
             number_counts = Counter(all_numbers)
             most_common = number_counts.most_common(5)
             least_common = number_counts.most_common()[:-6:-1]
-            
+        
             # Hot numbers (appeared in last 5 periods)
             hot_numbers = set()
-            for result in recent_data.head(5)['Result']:
+            for result in recent_results[:5]:
                 if isinstance(result, str) and result.strip():
                     hot_numbers.update(list(result.strip()))
-            
+        
             # Cold numbers (not appeared in last 10 periods)
             cold_numbers = set()
             recent_numbers = set()
-            for result in recent_data.head(10)['Result']:
+            for result in recent_results[:10]:
                 if isinstance(result, str) and result.strip():
                     recent_numbers.update(list(result.strip()))
-            
+        
             all_unique_numbers = set('0123456789')
             cold_numbers = all_unique_numbers - recent_numbers
-            
-            # Prepare analysis result
-            analysis_text = f"""
-📊 *Analisis Data Terbaru* (30 periode terakhir)
+        
+        # Full-history frequency (from the shard index when sharding is on)
+        summary = await self.history.summary()
+        history_total = int(summary['digits'].sum())
+        history_common = sorted(range(10), key=lambda digit: -summary['digits'][digit])[:5]
+        
+        return f"""
+📊 *Analisis Data Terbaru* ({len(recent_data)} periode terakhir)
 
 🔢 *Frekuensi Angka:*
 - Angka paling sering muncul: {', '.join([f'{num[0]} ({num[1]}x)' for num in most_common])}
@@ -204,88 +210,270 @@ class TogelAnalysisBot:
 ❄️ *Angka Dingin* (tidak muncul dalam 10 periode terakhir):
 {', '.join(sorted(cold_numbers)) if cold_numbers else 'Tidak ada'}
 
-📅 *Update terakhir:* {recent_data.iloc[0]['Tanggal'].strftime('%d/%m/%Y')}
+📚 *Seluruh Histori* ({summary['rows']} data):
+- Angka paling sering muncul: {', '.join([f"{digit} ({summary['digits'][digit] / history_total:.1%})" for digit in history_common]) if history_total else 'Tidak ada data'}
+
+📅 *Update terakhir:* {recent_data.dates()[0].strftime('%d/%m/%Y')}
 """
-            await update.message.reply_text(analysis_text, parse_mode='Markdown')
-            
-        except Exception as e:
-            logger.error(f"Error in analysis: {e}")
-            await update.message.reply_text("❌ Terjadi kesalahan saat menganalisis data.")
     
-    async def prediksi_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Generate prediction"""
-        try:
-            df = self.get_dataframe()
-            if df is None or df.empty:
-                await update.message.reply_text("❌ Tidak ada data yang ditemukan di spreadsheet.")
-                return
-            
-            # Get recent data
-            recent_data = df.head(50)
-            
+    async def build_prediction(self, recent_data):
+        """Deterministic parts of a prediction for ``recent_data``, None when it has no valid results"""
+        recent_results = recent_data.results()
+        
+        with phase('analysis'):
             # Method 1: Most frequent numbers
             all_numbers = []
-            for result in recent_data['Result']:
+            for result in recent_results:
                 if isinstance(result, str) and result.strip():
                     all_numbers.extend(list(result.strip()))
-            
+        
             if not all_numbers:
-                await update.message.reply_text("❌ Tidak ada data angka yang valid untuk diprediksi.")
-                return
-            
+                return None
+        
             number_counts = Counter(all_numbers)
             top_numbers = [num[0] for num in number_counts.most_common(10)]
-            
+        
             # Method 2: Hot numbers (last 5 periods)
             hot_numbers = set()
-            for result in recent_data.head(5)['Result']:
+            for result in recent_results[:5]:
                 if isinstance(result, str) and result.strip():
                     hot_numbers.update(list(result.strip()))
-            
+        
             # Method 3: Date-based prediction
-            last_date = recent_data.iloc[0]['Tanggal']
+            last_date = recent_data.dates()[0]
             day_number = last_date.day % 10
             month_number = last_date.month % 10
             date_based = {str(day_number), str(month_number)}
-            
+        
             # Method 4: Weighted random selection
             weighted_numbers = []
             for num, count in number_counts.items():
                 weighted_numbers.extend([num] * count)
-            
-            # Generate predictions using different methods
-            prediction_text = f"""
+        
+        return {
+            'rows': len(recent_data),
+            'number_counts': number_counts,
+            'top_numbers': top_numbers,
+            'hot_numbers': hot_numbers,
+            'date_based': date_based,
+            'weighted_numbers': weighted_numbers,
+            'cross_pattern': self.generate_cross_pattern(recent_data),
+        }
+    
+    def format_prediction(self, prediction):
+        """Prediction message; the random picks are drawn anew on every call"""
+        hot_numbers = prediction['hot_numbers']
+        date_based = prediction['date_based']
+        
+        # Generate predictions using different methods
+        return f"""
 🎯 *Prediksi Angka untuk Periode Berikutnya*
 
-📊 Berdasarkan analisis {len(recent_data)} data terakhir:
+📊 Berdasarkan analisis {prediction['rows']} data terakhir:
 
-1. *Frekuensi Tinggi*: {', '.join(top_numbers[:5])}
+1. *Frekuensi Tinggi*: {', '.join(prediction['top_numbers'][:5])}
 2. *Angka Panas*: {', '.join(sorted(hot_numbers)) if hot_numbers else 'Tidak ada data'}
 3. *Berdasarkan Tanggal*: {', '.join(sorted(date_based))}
-4. *Angka Acak Terbobot*: {self.generate_weighted_number(weighted_numbers)}
-5. *Polasilang*: {self.generate_cross_pattern(recent_data)}
+4. *Angka Acak Terbobot*: {self.generate_weighted_number(prediction['weighted_numbers'])}
+5. *Polasilang*: {prediction['cross_pattern']}
 
 💡 *Rekomendasi Kombinasi*:
-{self.generate_recommendation(number_counts, hot_numbers, date_based)}
+{self.generate_recommendation(prediction['number_counts'], hot_numbers, date_based)}
 
 ⚠️ *Catatan*: Prediksi ini berdasarkan analisis statistik dan tidak menjamin kemenangan.
 """
-            await update.message.reply_text(prediction_text, parse_mode='Markdown')
+    
+    async def get_text(self, kind, limit, stale=True):
+        """Analysis or prediction text over the newest ``limit`` rows, computed once per dataset version.
+
+        Returns ``(dataset, text)``; the dataset is None when the sheet could
+        not be read or is empty and the text None when it has no valid results.
+        Only the deterministic parts of a prediction are shared; its random
+        picks differ per request.
+        """
+        recent_data = await self.get_dataset(limit)
+        if recent_data is None or recent_data.empty:
+            return None, None
+        build = self.build_analysis_text if kind == 'analisis' else self.build_prediction
+        result = await self.results.get((kind, limit), self.history.version, lambda: build(recent_data), stale=stale)
+        if kind == 'prediksi' and result is not None:
+            result = self.format_prediction(result)
+        return recent_data, result
+    
+    @timed_handler
+    @limit_concurrency('analysis')
+    async def analisis_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Analyze the data"""
+        try:
+            # Get last 30 records for analysis
+            recent_data, analysis_text = await self.get_text('analisis', ANALYSIS_DEFAULT_ROWS, stale=False)
+            if recent_data is None:
+                await update.message.reply_text("❌ Tidak ada data yang ditemukan di spreadsheet.")
+                return
+            if analysis_text is None:
+                await update.message.reply_text("❌ Tidak ada data angka yang valid untuk dianalisis.")
+                return
+            
+            with phase('reply_text'):
+                await update.message.reply_text(analysis_text, parse_mode='Markdown')
+            
+        except Exception as e:
+            logger.error(f"Error in analysis: {e}")
+            await update.message.reply_text("❌ Terjadi kesalahan saat menganalisis data.")
+    
+    @timed_handler
+    @limit_concurrency('analysis')
+    async def prediksi_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Generate prediction"""
+        try:
+            # Get recent data
+            recent_data, prediction_text = await self.get_text('prediksi', PREDICTION_ROWS, stale=False)
+            if recent_data is None:
+                await update.message.reply_text("❌ Tidak ada data yang ditemukan di spreadsheet.")
+                return
+            if prediction_text is None:
+                await update.message.reply_text("❌ Tidak ada data angka yang valid untuk diprediksi.")
+                return
+            
+            with phase('reply_text'):
+                await update.message.reply_text(prediction_text, parse_mode='Markdown')
             
         except Exception as e:
             logger.error(f"Error generating prediction: {e}")
             await update.message.reply_text("❌ Terjadi kesalahan saat membuat prediksi.")
     
+    def parse_inline_query(self, query):
+        """Turn an inline query into the ``(kind, limit)`` pairs to offer"""
+        words = query.lower().split()
+        if words and words[0] in INLINE_TITLES:
+            kind = words[0]
+            if kind == 'analisis':
+                limit = ANALYSIS_DEFAULT_ROWS
+                if len(words) > 1 and words[1].isdigit():
+                    limit = min(max(int(words[1]), 10), INLINE_MAX_ROWS)
+            else:
+                limit = PREDICTION_ROWS
+            return [(kind, limit)]
+        # Empty or unknown query: offer both with their defaults
+        return [('prediksi', PREDICTION_ROWS), ('analisis', ANALYSIS_DEFAULT_ROWS)]
+    
+    def inline_article(self, article_id, title, description, text, parse_mode=None):
+        return InlineQueryResultArticle(
+            id=article_id,
+            title=title,
+            description=description,
+            input_message_content=InputTextMessageContent(text, parse_mode=parse_mode),
+        )
+    
+    @timed_handler
+    async def inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Answer ``@bot prediksi`` / ``@bot analisis 100`` from precomputed results"""
+        queries = self.parse_inline_query(update.inline_query.query)
+        # A cold start may still be reading the sheet; whatever misses the deadline keeps computing in the background
+        task = asyncio.ensure_future(asyncio.gather(*(self.get_text(kind, limit) for kind, limit in queries),
+                                                    return_exceptions=True))
+        try:
+            answers = await asyncio.wait_for(asyncio.shield(task), self.inline_deadline)
+        except asyncio.TimeoutError:
+            answers = None
+        
+        results = []
+        cache_time = self.inline_cache_time
+        failed = False
+        if answers is None:
+            # Not computed within the deadline; ask Telegram to come back soon
+            cache_time = INLINE_RETRY_CACHE_TIME
+            results.append(self.inline_article(
+                'loading', "⏳ Data sedang disiapkan", "Coba lagi dalam beberapa detik",
+                "⏳ Data sedang disiapkan, coba lagi dalam beberapa detik."
+            ))
+        else:
+            for (kind, limit), answer in zip(queries, answers):
+                if isinstance(answer, Exception):
+                    logger.error(f"Error answering inline query: {answer}")
+                    failed = True
+                    answer = (None, None)
+                recent_data, text = answer
+                if recent_data is None:
+                    # Sheet not readable (or empty) right now, try again soon
+                    cache_time = INLINE_RETRY_CACHE_TIME
+                elif text is not None:
+                    results.append(self.inline_article(
+                        f'{kind}-{limit}-{self.history.version}', INLINE_TITLES[kind],
+                        f"Berdasarkan {len(recent_data)} data terakhir", text, parse_mode='Markdown'
+                    ))
+            if not results and failed:
+                results.append(self.inline_article(
+                    'error', "❌ Terjadi kesalahan", "Coba lagi dalam beberapa detik",
+                    "❌ Terjadi kesalahan saat mengambil data."
+                ))
+            elif not results:
+                results.append(self.inline_article(
+                    'empty', "❌ Tidak ada data", "Belum ada data angka yang valid untuk dianalisis",
+                    "❌ Tidak ada data angka yang valid untuk dianalisis."
+                ))
+        
+        # Answers do not depend on who asks, so Telegram may share them between users
+        with phase('answer_inline'):
+            await update.inline_query.answer(results, cache_time=cache_time, is_personal=False)
+    
+    async def precompute_defaults(self):
+        """Compute the default inline answers so the first queries are served from memory"""
+        for kind, limit in self.parse_inline_query(''):
+            try:
+                await self.get_text(kind, limit, stale=False)
+            except Exception as e:
+                logger.error(f"Error precomputing {kind}: {e}")
+    
+    @timed_handler
+    async def grafik_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Send a position heatmap or a trend chart of recent results"""
+        kind, limit = 'heatmap', CHART_DEFAULT_ROWS
+        for arg in context.args or []:
+            if arg.lower() in CHART_KINDS:
+                kind = arg.lower()
+            elif arg.isdigit():
+                limit = min(max(int(arg), 10), CHART_MAX_ROWS)
+            else:
+                await update.message.reply_text(
+                    "❌ Format: /grafik [heatmap|tren] [jumlah data]\n"
+                    "Contoh: /grafik tren 200"
+                )
+                return
+        
+        try:
+            recent_data = await self.get_dataset(limit)
+            if recent_data is None or recent_data.empty:
+                await update.message.reply_text("❌ Tidak ada data yang ditemukan di spreadsheet.")
+                return
+            
+            # Same data version and parameters give the same picture
+            title = f"{CHART_KINDS[kind]} ({len(recent_data)} data terakhir)"
+            key = (self.history.version, kind, limit)
+            if kind == 'heatmap':
+                entry = await self.charts.render(key, render_heatmap, recent_data.digits, title)
+            else:
+                entry = await self.charts.render(key, render_trend, recent_data.tanggal, recent_data.digits, title)
+            
+            with phase('reply_photo'):
+                message = await update.message.reply_photo(entry.file_id or entry.png, caption=f"📊 {title}")
+            if entry.file_id is None:
+                self.charts.remember_file_id(entry, message.photo[-1].file_id)
+            
+        except Exception as e:
+            logger.error(f"Error rendering chart: {e}")
+            await update.message.reply_text("❌ Terjadi kesalahan saat membuat grafik.")
+    
     def generate_weighted_number(self, weighted_numbers):
         """Generate weighted random number"""
         if not weighted_numbers:
             return "Tidak cukup data"
         return ', '.join(random.sample(weighted_numbers, min(3, len(weighted_numbers))))
     
-    def generate_cross_pattern(self, df):
+    def generate_cross_pattern(self, dataset):
         """Generate cross pattern prediction"""
         try:
-            last_results = df.head(5)['Result'].tolist()
+            last_results = dataset.head(5).results()
             if len(last_results) < 5:
                 return "Tidak cukup data"
             
@@ -325,9 +513,29 @@ class TogelAnalysisBot:
         
         return '\n'.join([f"- {rec}" for rec in recommendations])
     
-    def run(self):
-        """Run the bot"""
-        application = Application.builder().token(self.bot_token).build()
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Show handler latency and Sheets API statistics (admin only)"""
+        if update.effective_user.id not in self.admin_ids:
+            await update.message.reply_text("❌ Perintah ini hanya untuk admin.")
+            return
+        
+        report = metrics.format_report()
+        for i in range(0, len(report), 3900):
+            await update.message.reply_text(f"```\n{report[i:i+3900]}\n```", parse_mode='Markdown')
+    
+    async def post_init(self, application):
+        """Compute the default inline answers before polling starts"""
+        await self.precompute_defaults()
+    
+    def build_application(self, request=None):
+        """Create the Application with all handlers registered"""
+        builder = Application.builder().token(self.bot_token).post_init(self.post_init)
+        if self.update_concurrency > 1:
+            # Concurrent across users, sequential per user so conversations stay consistent
+            builder = builder.concurrent_updates(KeyedUpdateProcessor(self.update_concurrency))
+        if request is not None:
+            builder = builder.request(request)
+        application = builder.build()
         
         # Add handlers
         application.add_handler(CommandHandler('start', self.start))
@@ -335,6 +543,14 @@ class TogelAnalysisBot:
         application.add_handler(CommandHandler('metode', self.metode_command))
         application.add_handler(CommandHandler('analisis', self.analisis_command))
         application.add_handler(CommandHandler('prediksi', self.prediksi_command))
+        application.add_handler(CommandHandler('grafik', self.grafik_command))
+        application.add_handler(CommandHandler('stats', self.stats_command))
+        application.add_handler(InlineQueryHandler(self.inline_query))
+        return application
+    
+    def run(self):
+        """Run the bot"""
+        application = self.build_application()
         
         # Run the bot
         logger.info("🤖 Bot Analisis Togel sedang berjalan...")
@@ -345,4 +561,4 @@ if __name__ == '__main__':
         bot = TogelAnalysisBot()
         bot.run()
     except Exception as e:
-        logger.error(f"Bot failed to start: {e}")
\ No newline at end of file
+        logger.error(f"Bot failed to start: {e}")
\ No newline at end of file
@@ -0,0 +1 @@
+"""Shared helpers used by bot1, bot2 and the bot manager."""
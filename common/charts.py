@@ -0,0 +1,169 @@
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from common.metrics import phase
+
+logger = logging.getLogger(__name__)
+
+# Names of the four Result positions, first digit first
+POSITIONS = ['As', 'Kop', 'Kepala', 'Ekor']
+
+# At most this many points on the x axis of a trend chart
+TREND_BINS = 20
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_chart_pool():
+    """Return the process pool charts are rendered in.
+
+    Rendering is CPU bound, so it runs in separate processes instead of the
+    event loop's threads. ``spawn`` keeps the children free of the parent's
+    threads and sockets; matplotlib is imported in the children only.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = int(os.getenv('CHART_WORKERS', '1'))
+            _pool = ProcessPoolExecutor(max_workers=max(1, workers), mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _discard_pool(pool):
+    """Forget a pool whose worker died so the next render starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def _figure(width, height):
+    # Imported here so bots that never draw a chart never load matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(width, height), dpi=100)
+    FigureCanvasAgg(figure)
+    return figure
+
+
+def _png(figure):
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+
+def position_counts(digits):
+    """(4, 10) counts of each digit at each Result position"""
+    counts = np.zeros((4, 10), dtype=np.int64)
+    for position in range(4):
+        counts[position] = np.bincount(digits[:, position], minlength=10)
+    return counts
+
+
+def render_heatmap(digits, title):
+    """PNG heatmap of digit frequency per position for an (n, 4) digit array"""
+    counts = position_counts(digits)
+    figure = _figure(8, 3.6)
+    axes = figure.add_subplot()
+    image = axes.imshow(counts, cmap='YlOrRd', aspect='auto')
+    axes.set_xticks(range(10))
+    axes.set_yticks(range(4), POSITIONS)
+    axes.set_xlabel('Angka')
+    axes.set_title(title)
+    for position in range(4):
+        for digit in range(10):
+            axes.text(digit, position, counts[position, digit], ha='center', va='center', fontsize=8)
+    figure.colorbar(image, ax=axes, label='Muncul')
+    figure.tight_layout()
+    return _png(figure)
+
+
+def render_trend(tanggal, digits, title):
+    """PNG line chart of each digit's share over time, data sorted newest first"""
+    # Oldest first, split into at most TREND_BINS consecutive windows
+    tanggal, digits = tanggal[::-1], digits[::-1]
+    bins = np.array_split(np.arange(len(digits)), min(TREND_BINS, len(digits)))
+    shares = np.array([np.bincount(digits[rows].ravel(), minlength=10) / (4 * len(rows)) for rows in bins])
+    labels = [str(tanggal[rows[-1]].astype(object).strftime('%d/%m/%y')) for rows in bins]
+
+    figure = _figure(9, 4.5)
+    axes = figure.add_subplot()
+    for digit in range(10):
+        axes.plot(range(len(bins)), shares[:, digit] * 100, marker='o', markersize=3, label=str(digit))
+    axes.axhline(10, color='grey', linestyle='--', linewidth=0.8)
+    axes.set_xticks(range(len(bins)), labels, rotation=45, ha='right', fontsize=7)
+    axes.set_ylabel('% kemunculan')
+    axes.set_title(title)
+    axes.legend(title='Angka', ncol=2, fontsize=7, loc='upper left', bbox_to_anchor=(1.01, 1))
+    figure.tight_layout()
+    return _png(figure)
+
+
+class ChartEntry:
+    __slots__ = ('png', 'file_id')
+
+    def __init__(self, png):
+        self.png = png
+        self.file_id = None
+
+
+class ChartCache:
+    """Rendered charts keyed by dataset version and chart parameters.
+
+    Concurrent requests for the same chart share one render. Once Telegram
+    has the photo its ``file_id`` is kept instead of the PNG bytes, so a
+    repeated request only sends the id.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or int(os.getenv('CHART_CACHE_SIZE', '32'))
+        self._entries = OrderedDict()
+        self._rendering = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def render(self, key, func, *args):
+        """Return the cached entry for ``key``, rendering ``func(*args)`` in the pool on a miss"""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        future = self._rendering.get(key)
+        if future is None:
+            future = self._rendering[key] = asyncio.ensure_future(self._render(func, *args))
+            future.add_done_callback(lambda _: self._rendering.pop(key, None))
+        with phase('render'):
+            png = await asyncio.shield(future)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = ChartEntry(png)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return entry
+
+    async def _render(self, func, *args):
+        pool = get_chart_pool()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+
+    def remember_file_id(self, entry, file_id):
+        entry.file_id = file_id
+        entry.png = None
@@ -0,0 +1,134 @@
+import asyncio
+import contextvars
+import functools
+import os
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from common.metrics import phase
+
+# The active slot of the update being processed, so limit_concurrency can hand it back while it waits
+_current_slot = contextvars.ContextVar('_current_slot', default=None)
+
+
+class _Slot:
+    """One of KeyedUpdateProcessor's active slots, which a handler may give back for a while"""
+
+    def __init__(self, semaphore):
+        self.semaphore = semaphore
+        self.held = False
+
+    async def acquire(self):
+        await self.semaphore.acquire()
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.semaphore.release()
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently while keeping each user's updates in order.
+
+    Updates sharing a (chat, user) key — the same key ConversationHandler
+    uses — run one after another in arrival order; different keys run in
+    parallel up to ``max_active`` at a time. The base class semaphore only
+    bounds how many updates may be pending, so one user flooding the bot
+    cannot take the active slots away from everyone else.
+    """
+
+    def __init__(self, max_active, max_pending=None):
+        super().__init__(max_pending or max_active * 16)
+        self.max_active = max_active
+        self._active = asyncio.BoundedSemaphore(max_active)
+        self._locks = {}
+
+    @staticmethod
+    def update_key(update):
+        if not isinstance(update, Update):
+            return None
+        chat = update.effective_chat
+        user = update.effective_user
+        return (chat.id if chat else None, user.id if user else None)
+
+    async def do_process_update(self, update, coroutine):
+        key = self.update_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # asyncio.Lock wakes waiters in FIFO order, preserving arrival order
+            async with entry[0]:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._locks.pop(key, None)
+
+    async def _run(self, coroutine):
+        slot = _Slot(self._active)
+        await slot.acquire()
+        token = _current_slot.set(slot)
+        try:
+            await coroutine
+        finally:
+            _current_slot.reset(token)
+            slot.release()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+_handler_limits = {}
+
+
+def limit_concurrency(group, default=2):
+    """Cap how many calls of an expensive handler group run at once.
+
+    The cap is read from ``<GROUP>_CONCURRENCY`` (e.g. ``ANALYSIS_CONCURRENCY``).
+    While a call waits for the group it gives its KeyedUpdateProcessor slot
+    back, so queued expensive commands do not hold up other users' updates.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            # Semaphores belong to one event loop, so keep one per loop
+            key = (group, asyncio.get_running_loop())
+            semaphore = _handler_limits.get(key)
+            if semaphore is None:
+                limit = int(os.getenv(f'{group.upper()}_CONCURRENCY', str(default)))
+                semaphore = _handler_limits[key] = asyncio.Semaphore(max(1, limit))
+            with phase('concurrency_wait'):
+                slot = _current_slot.get()
+                if slot is None or not semaphore.locked():
+                    await semaphore.acquire()
+                else:
+                    slot.release()
+                    acquired = False
+                    try:
+                        await semaphore.acquire()
+                        acquired = True
+                        await slot.acquire()
+                    except BaseException:
+                        if acquired:
+                            semaphore.release()
+                        raise
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                semaphore.release()
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from common.metrics import background_task
+from common.scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE_READ, get_scheduler
+from common.sheets import add_append_listener, find_record_cache
+
+logger = logging.getLogger(__name__)
+
+# Tanggal, Periode, Result and User (columns B-E of bot1's layout); Timestamp is not needed
+DATA_RANGE = 'B2:E'
+
+_caches = {}
+_registry_lock = threading.Lock()
+
+
+def parse_tanggal(value):
+    """Parse a DD/MM/YYYY Tanggal like bot1 validates it, None when invalid"""
+    try:
+        return datetime.strptime(str(value).strip(), '%d/%m/%Y').date()
+    except ValueError:
+        return None
+
+
+def _parse_fixed_dates(values):
+    """Decode 10-character ASCII DD/MM/YYYY strings at once, anything else becomes NaT"""
+    raw = np.frombuffer(''.join(values).encode('ascii'), dtype=np.uint8).reshape(-1, 10)
+    digits = raw.astype(np.int64) - ord('0')
+    digit_columns = digits[:, [0, 1, 3, 4, 6, 7, 8, 9]]
+    valid = ((raw[:, 2] == ord('/')) & (raw[:, 5] == ord('/'))
+             & ((digit_columns >= 0) & (digit_columns <= 9)).all(axis=1))
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 3] * 10 + digits[:, 4]
+    year = digits[:, 6] * 1000 + digits[:, 7] * 100 + digits[:, 8] * 10 + digits[:, 9]
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype('datetime64[M]')
+    dates = months.astype('datetime64[D]') + np.where(valid, day - 1, 0).astype('timedelta64[D]')
+    # Days past the end of the month (e.g. 31/02) roll into the next month
+    valid &= dates.astype('datetime64[M]') == months
+    dates[~valid] = np.datetime64('NaT')
+    return dates
+
+
+def _parse_dates(values):
+    """Parse DD/MM/YYYY strings into datetime64[D], invalid dates become NaT"""
+    parsed = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[D]')
+    fixed = np.fromiter((len(value) == 10 and value.isascii() for value in values), dtype=bool, count=len(values))
+    if fixed.any():
+        # Fast path for the usual zero-padded values
+        rows = np.flatnonzero(fixed)
+        parsed[rows] = _parse_fixed_dates([values[row] for row in rows])
+
+    # Everything else (e.g. '1/2/2025') the way bot1 validates input
+    for row in np.flatnonzero(np.isnat(parsed)):
+        date = parse_tanggal(values[row])
+        if date is not None:
+            parsed[row] = np.datetime64(date, 'D')
+    return parsed
+
+
+def _parse_four_digits(values):
+    """Turn 4-digit strings into an (n, 4) uint8 array plus a validity mask"""
+    joined = ''.join(values)
+    if len(joined) == 4 * len(values) and joined.isascii() and joined.isdigit():
+        # Fast path: all values are well-formed
+        digits = np.frombuffer(joined.encode('ascii'), dtype=np.uint8).reshape(-1, 4) - ord('0')
+        return digits, np.ones(len(values), dtype=bool)
+
+    normalized = [value.strip().zfill(4) if value.strip() else '' for value in values]
+    valid = np.fromiter((len(v) == 4 and v.isascii() and v.isdigit() for v in normalized),
+                        dtype=bool, count=len(normalized))
+    joined = ''.join(v if ok else '0000' for v, ok in zip(normalized, valid))
+    digits = np.frombuffer(joined.encode('ascii'), dtype=np.uint8).reshape(-1, 4) - ord('0')
+    return digits, valid
+
+
+class Dataset:
+    """Columnar analysis data sorted by Tanggal, newest first.
+
+    ``tanggal`` is datetime64[D], ``periode`` int16, ``digits`` an (n, 4)
+    uint8 array of the Result digits and ``user`` a pandas Categorical.
+    """
+
+    __slots__ = ('tanggal', 'periode', 'digits', 'user')
+
+    def __init__(self, tanggal, periode, digits, user):
+        self.tanggal = tanggal
+        self.periode = periode
+        self.digits = digits
+        self.user = user
+
+    @classmethod
+    def from_values(cls, rows):
+        """Build a dataset from raw ``[Tanggal, Periode, Result, User]`` rows"""
+        rows = [row + [''] * (4 - len(row)) if len(row) < 4 else row for row in rows]
+        tanggal_raw, periode_raw, result_raw, user_raw = (list(column) for column in zip(*rows)) if rows else ([], [], [], [])
+
+        tanggal = _parse_dates(tanggal_raw)
+        periode_digits, periode_valid = _parse_four_digits(periode_raw)
+        digits, result_valid = _parse_four_digits(result_raw)
+
+        # Same filter as before: drop invalid dates; also drop malformed results
+        keep = ~np.isnat(tanggal) & result_valid
+        weights = np.array([1000, 100, 10, 1], dtype=np.int16)
+        periode = np.where(periode_valid, periode_digits.astype(np.int16) @ weights, -1).astype(np.int16)
+        user = pd.Categorical(user_raw)
+
+        dataset = cls(tanggal[keep], periode[keep], digits[keep], user[keep])
+        return dataset.sorted()
+
+    @classmethod
+    def concat(cls, first, second):
+        user = pd.Categorical(np.concatenate([np.asarray(first.user, dtype=object), np.asarray(second.user, dtype=object)]))
+        return cls(
+            np.concatenate([first.tanggal, second.tanggal]),
+            np.concatenate([first.periode, second.periode]),
+            np.concatenate([first.digits, second.digits]),
+            user,
+        ).sorted()
+
+    def sorted(self):
+        # Stable descending sort keeps sheet order for rows with the same date
+        order = np.argsort(-self.tanggal.astype(np.int64), kind='stable')
+        return Dataset(self.tanggal[order], self.periode[order], self.digits[order], self.user[order])
+
+    def __len__(self):
+        return len(self.tanggal)
+
+    @property
+    def empty(self):
+        return len(self.tanggal) == 0
+
+    @property
+    def nbytes(self):
+        return (self.tanggal.nbytes + self.periode.nbytes + self.digits.nbytes
+                + self.user.codes.nbytes + sum(len(str(c)) for c in self.user.categories))
+
+    def head(self, n):
+        return Dataset(self.tanggal[:n], self.periode[:n], self.digits[:n], self.user[:n])
+
+    def results(self):
+        """Result values as 4-character strings"""
+        return [value.decode('ascii') for value in (self.digits + ord('0')).view('S4').ravel()]
+
+    def dates(self):
+        """Tanggal values as ``datetime.date`` objects"""
+        return self.tanggal.astype(object).tolist()
+
+
+def get_dataset_cache(client, spreadsheet_id, sheet_name, ttl=None, worksheet=None):
+    """Return the shared analysis dataset cache for a worksheet, opening it unless ``worksheet`` is given"""
+    key = (spreadsheet_id, sheet_name)
+    with _registry_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            sheet = worksheet or get_scheduler().call(
+                'open_worksheet', lambda: client.open_by_key(spreadsheet_id).worksheet(sheet_name)
+            )
+            cache = DatasetCache(sheet, ttl=ttl, key=key)
+            add_append_listener(spreadsheet_id, sheet_name, cache.on_append)
+            _caches[key] = cache
+        return cache
+
+
+class DatasetCache:
+    """Keeps the column-pruned Dataset of a worksheet, like RecordCache does for records.
+
+    When bot1 runs in the same process its RecordCache of the worksheet
+    (found through ``key``) already holds every row, so the dataset is
+    derived from those records and follows their refreshes instead of
+    reading the sheet a second time.
+    """
+
+    def __init__(self, sheet, ttl=None, key=None):
+        self.sheet = sheet
+        self.ttl = ttl if ttl is not None else float(os.getenv('SHEET_CACHE_TTL', '60'))
+        self.key = key
+        self.version = 0
+        self.scheduler = get_scheduler()
+        self._dataset = None
+        self._pending_rows = []
+        self._loaded_at = 0.0
+        self._refresh_task = None
+        self._load_task = None
+        self._records = None
+        self._records_version = None
+
+    async def get_dataset(self):
+        """Return the dataset, loading it on first use"""
+        if self._dataset is None:
+            # Callers arriving during the first load share it instead of each parsing the rows
+            if self._load_task is None:
+                self._load_task = asyncio.ensure_future(self.refresh())
+                self._load_task.add_done_callback(self._clear_load_task)
+            await asyncio.shield(self._load_task)
+        elif self._records is not None:
+            # The record cache refreshes itself; rebuild only when its rows changed
+            records = await self._records.get_records()
+            if self._records.version != self._records_version:
+                self._load_records(records)
+        elif time.monotonic() - self._loaded_at > self.ttl and self._refresh_task is None:
+            self._refresh_task = background_task(self._background_refresh())
+        if self._pending_rows:
+            rows, self._pending_rows = self._pending_rows, []
+            self._dataset = Dataset.concat(self._dataset, Dataset.from_values(rows))
+            self.version += 1
+        return self._dataset
+
+    def _clear_load_task(self, task):
+        self._load_task = None
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh(priority=PRIORITY_BACKGROUND)
+        except Exception as e:
+            logger.warning(f"Background refresh of {self.sheet.title} failed: {e}")
+            self._loaded_at = time.monotonic()
+        finally:
+            self._refresh_task = None
+
+    async def refresh(self, priority=PRIORITY_INTERACTIVE_READ):
+        """Reload the needed columns from the sheet as raw values"""
+        records = find_record_cache(*self.key) if self.key else None
+        if records is not None:
+            self._records = records
+            return self._load_records(await records.get_records())
+        rows = await self.scheduler.run(
+            'get_values', self.sheet.get_values, DATA_RANGE,
+            kind='read', priority=priority, key=('get_values', id(self.sheet), DATA_RANGE)
+        )
+        self._dataset = Dataset.from_values(rows)
+        self._pending_rows = []
+        self._loaded_at = time.monotonic()
+        self.version += 1
+        return self._dataset
+
+    def _load_records(self, records):
+        # Columns B-E, as strings like get_values() returns them; Periode and
+        # Result lose their leading zeros in records and are padded again
+        self._dataset = Dataset.from_values([[str(value) for value in list(record.values())[1:5]] for record in records])
+        self._records_version = self._records.version
+        self._pending_rows = []
+        self._loaded_at = time.monotonic()
+        self.version += 1
+        return self._dataset
+
+    def on_append(self, row_data):
+        """Pick up a row bot1 appended in this process without reloading"""
+        if self._dataset is not None:
+            self._pending_rows.append([str(value) for value in row_data[1:5]])
+            if self._records is not None and self._records_version == self._records.version - 1:
+                # The append was the records' only change, the pending row covers it
+                self._records_version = self._records.version
@@ -0,0 +1,87 @@
+import csv
+import os
+import tempfile
+from itertools import islice
+
+from common.dataset import parse_tanggal
+
+# Columns bot1 writes, in sheet order
+COLUMNS = ['Timestamp', 'Tanggal', 'Periode', 'Result', 'User']
+
+# Rows handed to the writer at a time
+EXPORT_CHUNK = 5000
+
+FORMATS = ('csv', 'xlsx')
+
+
+def export_rows(chunks, user=None, first=None, last=None):
+    """Yield filtered records from ``chunks`` as rows of strings.
+
+    ``chunks`` are record lists as returned by ``record_chunks()``; they
+    are walked by index so rows appended meanwhile never break iteration.
+    Periode and Result get their leading zeros back, which the record
+    cache loses when it numericises values.
+    """
+    # Many rows share a Tanggal, so each distinct value is parsed once
+    dates = {}
+    for records in chunks:
+        for index in range(len(records)):
+            record = records[index]
+            if user is not None and str(record.get('User', '')) != user:
+                continue
+            if first or last:
+                tanggal = record.get('Tanggal', '')
+                date = dates.get(tanggal)
+                if date is None and tanggal not in dates:
+                    date = dates[tanggal] = parse_tanggal(tanggal)
+                if date is None or (first and date < first) or (last and date > last):
+                    continue
+            row = [str(record.get(column, '')) for column in COLUMNS]
+            row[2] = row[2].zfill(4) if row[2] else row[2]
+            row[3] = row[3].zfill(4) if row[3] else row[3]
+            yield row
+
+
+def write_csv(path, rows):
+    count = 0
+    # utf-8-sig so Excel opens the file with the right encoding
+    with open(path, 'w', newline='', encoding='utf-8-sig') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(COLUMNS)
+        while True:
+            chunk = list(islice(rows, EXPORT_CHUNK))
+            if not chunk:
+                return count
+            writer.writerows(chunk)
+            count += len(chunk)
+
+
+def write_xlsx(path, rows):
+    # Imported here so bots that never export never load openpyxl
+    from openpyxl import Workbook
+
+    # Write-only workbooks stream rows to disk instead of keeping cells in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Data')
+    sheet.append(COLUMNS)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(path)
+    return count
+
+
+def write_export(file_format, chunks, user=None, first=None, last=None):
+    """Write matching records to a temporary file and return ``(path, row_count)``.
+
+    Runs in a worker thread; the caller deletes the file once it is sent.
+    """
+    handle, path = tempfile.mkstemp(prefix='export_', suffix=f'.{file_format}')
+    os.close(handle)
+    try:
+        writer = write_xlsx if file_format == 'xlsx' else write_csv
+        return path, writer(path, export_rows(chunks, user, first, last))
+    except BaseException:
+        os.unlink(path)
+        raise
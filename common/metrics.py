@@ -0,0 +1,177 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Geometric bucket bounds from 0.5 ms to ~2 minutes, 25% apart
+BUCKET_BOUNDS = []
+_bound = 0.0005
+while _bound < 120:
+    BUCKET_BOUNDS.append(_bound)
+    _bound *= 1.25
+BUCKET_BOUNDS.append(float('inf'))
+
+# Phase breakdown of the handler currently running in this context
+_current_trace = ContextVar('current_trace', default=None)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram, cheap enough for every handler call"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKET_BOUNDS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, q):
+        """Estimate the q-th percentile (0-100) in seconds"""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = BUCKET_BOUNDS[index - 1] if index else 0.0
+                upper = BUCKET_BOUNDS[index]
+                if upper == float('inf'):
+                    return lower
+                # Interpolate linearly inside the bucket
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return BUCKET_BOUNDS[-2]
+
+
+class Metrics:
+    """Process-wide registry of handler/phase latencies and Sheets call counters"""
+
+    def __init__(self):
+        self.handlers = {}
+        self.phases = {}
+        self.sheets_calls = {}
+        self.sheets_errors = {}
+        self._lock = threading.Lock()
+
+    @property
+    def slow_handler_ms(self):
+        # Read on use: the bots load .env after this module is imported
+        return float(os.getenv('SLOW_HANDLER_MS', '0'))
+
+    def observe_handler(self, name, seconds):
+        with self._lock:
+            histogram = self.handlers.get(name)
+            if histogram is None:
+                histogram = self.handlers[name] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def observe_phase(self, handler, name, seconds):
+        key = (handler or '-', name)
+        with self._lock:
+            histogram = self.phases.get(key)
+            if histogram is None:
+                histogram = self.phases[key] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def count_sheets_call(self, operation, ok=True):
+        with self._lock:
+            self.sheets_calls[operation] = self.sheets_calls.get(operation, 0) + 1
+            if not ok:
+                self.sheets_errors[operation] = self.sheets_errors.get(operation, 0) + 1
+
+    def format_report(self):
+        """Render p50/p95/p99 per handler and phase plus Sheets counters"""
+        def row(label, histogram):
+            return (f"{label[:44]:<44} {histogram.count:>6} "
+                    f"{histogram.percentile(50) * 1000:>7.0f} "
+                    f"{histogram.percentile(95) * 1000:>7.0f} "
+                    f"{histogram.percentile(99) * 1000:>7.0f}")
+
+        header = f"{'':<44} {'n':>6} {'p50ms':>7} {'p95ms':>7} {'p99ms':>7}"
+        with self._lock:
+            lines = ['Handler', header]
+            lines += [row(name, hist) for name, hist in sorted(self.handlers.items())]
+            lines += ['', 'Phase', header]
+            lines += [row(f"{handler}/{name}", hist) for (handler, name), hist in sorted(self.phases.items())]
+            lines += ['', 'Sheets API', f"{'':<44} {'calls':>6} {'errors':>7} {'rate':>7}"]
+            for operation, calls in sorted(self.sheets_calls.items()):
+                errors = self.sheets_errors.get(operation, 0)
+                lines.append(f"{operation[:44]:<44} {calls:>6} {errors:>7} {errors / calls:>7.1%}")
+        return '\n'.join(lines)
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def phase(name):
+    """Time a block as one phase of the running handler"""
+    trace = _current_trace.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe_phase(trace[0] if trace else None, name, elapsed)
+        if trace:
+            trace[1].append((name, elapsed))
+
+
+def background_task(coro):
+    """Start ``coro`` as a task outside the current handler's trace.
+
+    Tasks copy the caller's context, so work that no handler waits for would
+    otherwise have its phases charged to whichever handler started it.
+    """
+    return contextvars.Context().run(asyncio.ensure_future, coro)
+
+
+def timed_handler(func):
+    """Record the latency of an async Telegram handler and its phases.
+
+    Handlers slower than the bot's ``slow_handler_ms`` (``metrics.slow_handler_ms``
+    for objects without one) are logged with their phase breakdown.
+    """
+    owner, _, method = func.__qualname__.rpartition('.')
+    name = f"{owner.replace('Bot', '')}.{method.replace('_command', '')}" if owner else method
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = _current_trace.set((name, []))
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            trace = _current_trace.get()
+            _current_trace.reset(token)
+            metrics.observe_handler(name, elapsed)
+            threshold = getattr(args[0], 'slow_handler_ms', None) if args else None
+            if threshold is None:
+                threshold = metrics.slow_handler_ms
+            if threshold and elapsed * 1000 >= threshold:
+                breakdown = ', '.join(f"{phase_name}={seconds * 1000:.0f}ms" for phase_name, seconds in trace[1])
+                logger.warning(f"Slow handler {name}: {elapsed * 1000:.0f}ms ({breakdown or 'no phases'})")
+
+    return wrapper
+
+
+def parse_admin_ids(value):
+    """Parse a comma-separated ADMIN_USER_IDS value into a set of ints"""
+    admin_ids = set()
+    for part in (value or '').split(','):
+        part = part.strip()
+        if part.isdigit():
+            admin_ids.add(int(part))
+    return admin_ids
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from common.metrics import background_task, phase
+
+logger = logging.getLogger(__name__)
+
+
+class PrecomputedResults:
+    """Results computed once per dataset version and served from memory.
+
+    Each key is computed at most once per version, including results that
+    are empty (None); concurrent requests for the same key share that
+    computation. When a newer version arrives the previous result keeps
+    being served while the new one is computed in the background, so a
+    request only waits when nothing was computed for the key yet. A failed
+    computation is not retried for ``retry_after`` seconds.
+    """
+
+    def __init__(self, size=None, retry_after=5.0):
+        self.size = size or int(os.getenv('PRECOMPUTE_CACHE_SIZE', '64'))
+        self.retry_after = retry_after
+        self._results = OrderedDict()
+        self._running = {}
+        self._failed = {}
+
+    async def get(self, key, version, compute, stale=True):
+        """Return the result of ``compute()`` for ``key`` at ``version``.
+
+        With ``stale`` an older version's result is returned right away while
+        the current one is computed. Errors of ``compute()`` reach the callers
+        waiting for it; callers within ``retry_after`` get the same error.
+        """
+        cached = self._results.get(key)
+        if cached is not None:
+            self._results.move_to_end(key)
+            if cached[0] >= version:
+                return cached[1]
+
+        task = self._running.get((key, version))
+        failed = self._failed.get(key)
+        if task is None and failed is not None and failed[0] == version and time.monotonic() < failed[1]:
+            if stale and cached is not None:
+                return cached[1]
+            raise failed[2]
+        if task is None:
+            task = self._running[(key, version)] = background_task(self._compute(key, version, compute))
+            task.add_done_callback(lambda done: self._finished(key, version, done))
+        if stale and cached is not None:
+            return cached[1]
+
+        with phase('precompute'):
+            return await asyncio.shield(task)
+
+    def _finished(self, key, version, task):
+        self._running.pop((key, version), None)
+        # Retrieve the error here too, a background computation may have no one waiting for it
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error precomputing {key}: {task.exception()}")
+            self._failed[key] = (version, time.monotonic() + self.retry_after, task.exception())
+        else:
+            self._failed.pop(key, None)
+
+    async def _compute(self, key, version, compute):
+        result = await compute()
+        # A slow computation must not replace the result of a newer version
+        cached = self._results.get(key)
+        if cached is None or cached[0] < version:
+            self._results[key] = (version, result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.size:
+                self._results.popitem(last=False)
+        return result
@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def read_process_stats(pid):
+    """Read CPU time, RSS, open fds and thread count of a process from /proc"""
+    with open(f'/proc/{pid}/stat') as f:
+        # comm may contain spaces, so split after the closing parenthesis
+        fields = f.read().rsplit(')', 1)[1].split()
+    with open(f'/proc/{pid}/statm') as f:
+        rss_pages = int(f.read().split()[1])
+    try:
+        open_fds = len(os.listdir(f'/proc/{pid}/fd'))
+    except PermissionError:
+        open_fds = None
+
+    # fields[0] is the state (field 3 in proc(5)); utime/stime are fields 14/15
+    return {
+        'cpu_seconds': (int(fields[11]) + int(fields[12])) / CLOCK_TICKS,
+        'rss_bytes': rss_pages * PAGE_SIZE,
+        'open_fds': open_fds,
+        'threads': int(fields[17]),
+    }
+
+
+class ProcessSampler:
+    """Keeps the previous sample of each pid to derive CPU usage in percent"""
+
+    def __init__(self):
+        self._previous = {}
+
+    def sample(self, pid):
+        """Return the stats of a pid, or None when the process is gone"""
+        try:
+            stats = read_process_stats(pid)
+        except (FileNotFoundError, ProcessLookupError, IndexError, ValueError):
+            self._previous.pop(pid, None)
+            return None
+
+        now = time.monotonic()
+        previous = self._previous.get(pid)
+        if previous:
+            elapsed = now - previous[0]
+            stats['cpu_percent'] = 100.0 * (stats['cpu_seconds'] - previous[1]) / elapsed if elapsed > 0 else 0.0
+        else:
+            stats['cpu_percent'] = 0.0
+        self._previous[pid] = (now, stats['cpu_seconds'])
+        return stats
+
+
+def format_prometheus(metrics):
+    """Render ``{name: (type, help, [(labels, value), ...])}`` as Prometheus text"""
+    lines = []
+    for name, (metric_type, help_text, samples) in metrics.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in samples:
+            if value is None:
+                continue
+            label_text = ','.join(f'{key}="{val}"' for key, val in sorted(labels.items()))
+            lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def start_metrics_server(host, port, collect):
+    """Serve ``collect()`` on /metrics from a daemon thread and return the server"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = collect().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would flood the bot output
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='MetricsServer', daemon=True).start()
+    return server
@@ -0,0 +1,253 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import requests
+from gspread.exceptions import APIError
+from urllib3.exceptions import NewConnectionError
+
+from common.metrics import metrics, phase
+
+logger = logging.getLogger(__name__)
+
+# Lower value runs first
+PRIORITY_INTERACTIVE_WRITE = 0
+PRIORITY_INTERACTIVE_READ = 1
+PRIORITY_BACKGROUND = 2
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def _never_sent(error):
+    """Whether the request failed before reaching Sheets, so it cannot have been applied"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        # requests wraps urllib3's MaxRetryError, whose reason says which phase failed
+        return isinstance(getattr(error.args[0], 'reason', error.args[0]), NewConnectionError)
+    return False
+
+
+def is_retryable(error, kind='read'):
+    """Whether a failed Sheets call is worth retrying.
+
+    Writes are only retried when Sheets certainly did not apply them (429 or
+    a failed connect); after a timeout or 5xx an append may already have
+    landed, and repeating it would duplicate the row.
+    """
+    status = getattr(getattr(error, 'response', None), 'status_code', None) if isinstance(error, APIError) else None
+    if kind == 'write':
+        return status == 429 or _never_sent(error)
+    if isinstance(error, APIError):
+        return status in RETRYABLE_STATUS
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+class QuotaWindow:
+    """Sliding one-minute window of issued requests for one quota bucket"""
+
+    def __init__(self, limit, period=60.0):
+        self.limit = limit
+        self.period = period
+        self.issued = deque()
+
+    def _expire(self, now):
+        while self.issued and now - self.issued[0] >= self.period:
+            self.issued.popleft()
+
+    def usage(self, now):
+        self._expire(now)
+        return len(self.issued)
+
+    def wait_time(self, now, limit=None):
+        """Seconds until a request fits under ``limit`` (defaults to the quota)"""
+        limit = self.limit if limit is None else limit
+        self._expire(now)
+        if len(self.issued) < limit:
+            return 0.0
+        return self.period - (now - self.issued[len(self.issued) - limit])
+
+    def record(self, now):
+        self.issued.append(now)
+
+
+class _Job:
+    __slots__ = ('operation', 'func', 'args', 'kwargs', 'kind', 'priority', 'key', 'future', 'queued', 'attempt')
+
+    def __init__(self, operation, func, args, kwargs, kind, priority, key):
+        self.operation = operation
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.kind = kind
+        self.priority = priority
+        self.key = key
+        self.future = Future()
+        self.queued = True
+        self.attempt = 0
+
+
+class SheetsScheduler:
+    """Single entry point for Google Sheets traffic.
+
+    Calls run on a small pool of worker threads in priority order, stay under
+    the per-minute read and write quotas, share one future when identical
+    reads are already queued, and are retried with jittered exponential
+    backoff on 429/5xx and connection errors. Background work only uses the
+    quota above ``background_reserve`` so interactive requests keep headroom.
+
+    Reads and writes wait in separate queues, so a bucket that is out of
+    quota never holds up the other one. A retry goes back into its queue
+    with a not-before time instead of sleeping in a worker.
+    """
+
+    def __init__(self, read_quota=None, write_quota=None, workers=None, max_retries=None,
+                 backoff_base=1.0, backoff_cap=32.0, background_reserve=0.2):
+        self.quotas = {
+            'read': QuotaWindow(read_quota or int(os.getenv('SHEETS_READ_QUOTA', '60'))),
+            'write': QuotaWindow(write_quota or int(os.getenv('SHEETS_WRITE_QUOTA', '60'))),
+        }
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('SHEETS_MAX_RETRIES', '5'))
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.background_reserve = background_reserve
+        self.workers = workers or int(os.getenv('SHEETS_WORKERS', '2'))
+        # (priority, sequence, job) heaps per kind, plus (not_before, sequence, job) for retries
+        self._queues = {kind: [] for kind in self.quotas}
+        self._delayed = []
+        self._sequence = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._threads = []
+
+    def _ensure_workers(self):
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'SheetsWorker-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, operation, func, *args, kind='read', priority=PRIORITY_INTERACTIVE_READ, key=None, **kwargs):
+        """Queue a call and return a ``concurrent.futures.Future`` for its result"""
+        with self._lock:
+            self._ensure_workers()
+            if key is not None:
+                pending = self._pending.get(key)
+                if pending is not None:
+                    # Coalesce with the identical request that is still queued
+                    if priority < pending.priority:
+                        pending.priority = priority
+                        self._enqueue(pending)
+                    return pending.future
+            job = _Job(operation, func, args, kwargs, kind, priority, key)
+            if key is not None:
+                self._pending[key] = job
+            self._enqueue(job)
+            return job.future
+
+    def _enqueue(self, job):
+        heapq.heappush(self._queues[job.kind], (job.priority, next(self._sequence), job))
+        self._ready.notify()
+
+    def call(self, operation, func, *args, **kwargs):
+        """Run a call through the scheduler and block until it finishes"""
+        return self.submit(operation, func, *args, **kwargs).result()
+
+    async def run(self, operation, func, *args, **kwargs):
+        """Run a call through the scheduler without blocking the event loop"""
+        with phase(f'sheets.{operation}'):
+            return await asyncio.wrap_future(self.submit(operation, func, *args, **kwargs))
+
+    def _worker(self):
+        while True:
+            with self._ready:
+                job = self._next_job()
+                while job is None:
+                    self._ready.wait(self._wait_time())
+                    job = self._next_job()
+            if job.attempt == 0 and not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                metrics.count_sheets_call(job.operation, ok=False)
+                if job.attempt >= self.max_retries or not is_retryable(e, job.kind):
+                    job.future.set_exception(e)
+                    continue
+                # Full jitter keeps both bots from retrying in lockstep
+                delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** job.attempt))
+                job.attempt += 1
+                logger.warning(f"Sheets {job.operation} failed ({e}), retry {job.attempt} in {delay:.1f}s")
+                # Retries wait in the queue, not in the worker, and count against the quota again
+                with self._ready:
+                    job.queued = True
+                    heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._sequence), job))
+                    self._ready.notify()
+                continue
+            metrics.count_sheets_call(job.operation)
+            job.future.set_result(result)
+
+    def _next_job(self):
+        """Take the most urgent job whose own bucket has quota; call with the lock held"""
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            job = heapq.heappop(self._delayed)[2]
+            heapq.heappush(self._queues[job.kind], (job.priority, next(self._sequence), job))
+
+        best = None
+        for kind, jobs in self._queues.items():
+            # Drop entries of jobs that already ran, were re-queued with a higher priority or were cancelled
+            while jobs and (not jobs[0][2].queued or jobs[0][0] != jobs[0][2].priority or jobs[0][2].future.done()):
+                stale = heapq.heappop(jobs)[2]
+                if stale.future.done() and self._pending.get(stale.key) is stale:
+                    # Cancelled while queued; later identical calls must not join it
+                    self._pending.pop(stale.key)
+            if jobs and self._quota_wait(jobs[0][2], now) <= 0 and (best is None or jobs[0][:2] < best[:2]):
+                best = jobs[0]
+        if best is None:
+            return None
+
+        job = heapq.heappop(self._queues[best[2].kind])[2]
+        job.queued = False
+        self.quotas[job.kind].record(now)
+        if self._pending.get(job.key) is job:
+            self._pending.pop(job.key)
+        return job
+
+    def _wait_time(self):
+        """Seconds until a queued job may become runnable, None when nothing is queued"""
+        now = time.monotonic()
+        waits = [self._quota_wait(jobs[0][2], now) for jobs in self._queues.values() if jobs]
+        if self._delayed:
+            waits.append(self._delayed[0][0] - now)
+        return max(0.01, min(waits)) if waits else None
+
+    def _quota_wait(self, job, now):
+        """Seconds until the job's quota has room for it"""
+        window = self.quotas[job.kind]
+        limit = window.limit
+        if job.priority >= PRIORITY_BACKGROUND:
+            limit = max(1, int(window.limit * (1 - self.background_reserve)))
+        return window.wait_time(now, limit)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Return the process-wide Sheets scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SheetsScheduler()
+        return _scheduler
@@ -0,0 +1,495 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from gspread.exceptions import WorksheetNotFound
+
+from common.dataset import DATA_RANGE, Dataset, get_dataset_cache, parse_tanggal
+from common.metrics import background_task
+from common.scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE_WRITE,
+    get_scheduler,
+)
+from common.sheets import get_record_cache
+
+logger = logging.getLogger(__name__)
+
+# bot1's row layout, used by every shard
+HEADER = ['Timestamp', 'Tanggal', 'Periode', 'Result', 'User']
+INDEX_HEADER = ['Shard', 'Rows', 'Dari', 'Sampai'] + [f'Angka{digit}' for digit in range(10)]
+INDEX_RANGE = 'A2:N'
+
+# Rows per values.batchUpdate call, keeps request bodies well under the API's size limit
+WRITE_CHUNK = 10000
+
+_histories = {}
+_registry_lock = threading.Lock()
+
+
+def get_history(client, spreadsheet_id, sheet_name, shard_by=None, ttl=None):
+    """Return the shared history of a worksheet, split per period when ``shard_by`` is set"""
+    key = (spreadsheet_id, sheet_name, shard_by or None)
+    with _registry_lock:
+        history = _histories.get(key)
+        if history is None:
+            if shard_by:
+                history = ShardedHistory(client, spreadsheet_id, sheet_name, shard_by=shard_by, ttl=ttl)
+            else:
+                history = SheetHistory(client, spreadsheet_id, sheet_name, ttl=ttl)
+            _histories[key] = history
+        return history
+
+
+def _date_span(dataset):
+    """Oldest and newest Tanggal of a dataset sorted newest first"""
+    if dataset.empty:
+        return None, None
+    return dataset.tanggal[-1].astype(object), dataset.tanggal[0].astype(object)
+
+
+def _summary(rows, digits, first, last, shards):
+    return {'rows': rows, 'digits': digits, 'first': first, 'last': last, 'shards': shards}
+
+
+class SheetHistory:
+    """History kept in a single worksheet (the default layout)"""
+
+    sharded = False
+
+    def __init__(self, client, spreadsheet_id, sheet_name, ttl=None):
+        self.client = client
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.ttl = ttl
+        self.sheet = get_scheduler().call(
+            'open_worksheet', lambda: client.open_by_key(spreadsheet_id).worksheet(sheet_name)
+        )
+        self.dataset = get_dataset_cache(client, spreadsheet_id, sheet_name, ttl, worksheet=self.sheet)
+
+    @property
+    def records(self):
+        """Record cache of the sheet, only created for bots that read or append records.
+
+        Its existence lets ``dataset`` derive from it instead of reading the
+        sheet again, so a process without bot1 must not create it.
+        """
+        return get_record_cache(self.client, self.spreadsheet_id, self.sheet_name, self.ttl, worksheet=self.sheet)
+
+    @property
+    def version(self):
+        """Changes whenever the data returned by recent_dataset() may have changed"""
+        return self.dataset.version
+
+    async def append_row(self, row_data):
+        await self.records.append_row(row_data)
+
+    async def get_records(self):
+        """All records in sheet order"""
+        return await self.records.get_records()
+
+    async def record_chunks(self, first=None, last=None):
+        """Lists of records that may hold rows dated ``first``..``last`` (one list here)"""
+        return [await self.records.get_records()]
+
+    async def recent_dataset(self, limit):
+        """The newest ``limit`` rows as a Dataset"""
+        return (await self.dataset.get_dataset()).head(limit)
+
+    async def summary(self):
+        """Row count and digit counts of the whole history"""
+        dataset = await self.dataset.get_dataset()
+        digits = np.bincount(dataset.digits.ravel(), minlength=10)
+        return _summary(len(dataset), digits, *_date_span(dataset), 1)
+
+
+class ShardInfo:
+    """One row of the shard index: size, date span and digit counts of a shard"""
+
+    __slots__ = ('key', 'rows', 'first', 'last', 'digits', 'index_row')
+
+    def __init__(self, key, rows=0, first=None, last=None, digits=None, index_row=None):
+        self.key = key
+        self.rows = rows
+        self.first = first
+        self.last = last
+        self.digits = digits if digits is not None else np.zeros(10, dtype=np.int64)
+        self.index_row = index_row
+
+    @classmethod
+    def from_index_values(cls, key, values, index_row):
+        values = list(values) + [''] * (len(INDEX_HEADER) - len(values))
+        digits = np.array([int(value or 0) for value in values[4:14]], dtype=np.int64)
+        return cls(key, int(values[1] or 0), parse_tanggal(values[2]), parse_tanggal(values[3]), digits, index_row)
+
+    @classmethod
+    def from_values(cls, key, values, index_row=None):
+        """Summarise raw ``[Tanggal, Periode, Result, User]`` rows of a shard"""
+        dataset = Dataset.from_values(values)
+        return cls(
+            key, len(values), *_date_span(dataset),
+            np.bincount(dataset.digits.ravel(), minlength=10).astype(np.int64), index_row
+        )
+
+    def add(self, tanggal, result):
+        self.rows += 1
+        date = parse_tanggal(tanggal)
+        result = str(result)
+        if date is None or len(result) != 4 or not result.isdigit():
+            return
+        self.first = min(self.first, date) if self.first else date
+        self.last = max(self.last, date) if self.last else date
+        for digit in result:
+            self.digits[int(digit)] += 1
+
+    def index_values(self, name):
+        dates = [date.strftime('%d/%m/%Y') if date else '' for date in (self.first, self.last)]
+        return [name, self.rows] + dates + [int(count) for count in self.digits]
+
+
+class ShardedHistory:
+    """History split into one worksheet per period plus an index worksheet.
+
+    Rows go to ``<sheet>_<YYYY>`` (or ``<sheet>_<YYYY-MM>`` when sharding by
+    month) according to their Tanggal, so no worksheet grows without bound.
+    ``<sheet>_index`` holds each shard's row count, date span and digit
+    counts: full-history statistics come from it without reading any shard,
+    and recent windows only read the newest shards. Index updates from
+    appends are batched into one background write every few seconds.
+    """
+
+    sharded = True
+
+    def __init__(self, client, spreadsheet_id, sheet_name, shard_by='year', ttl=None):
+        if shard_by not in ('year', 'month'):
+            raise ValueError(f"SHEET_SHARD_BY must be 'year' or 'month', not {shard_by!r}")
+        self.client = client
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.shard_by = shard_by
+        self.index_name = f'{sheet_name}_index'
+        self.ttl = ttl if ttl is not None else float(os.getenv('SHEET_CACHE_TTL', '60'))
+        self.flush_delay = float(os.getenv('SHARD_INDEX_FLUSH_DELAY', '5'))
+        self.scheduler = get_scheduler()
+        self.spreadsheet = self.scheduler.call('open_spreadsheet', client.open_by_key, spreadsheet_id)
+        # One metadata call lists every worksheet, shards are opened from this map
+        self._worksheets = {sheet.title: sheet for sheet in self.scheduler.call('worksheets', self.spreadsheet.worksheets)}
+        self.shards = {}
+        self._datasets = {}
+        self._dirty = set()
+        self._flush_task = None
+        self._index_task = None
+        self._index_loaded_at = 0.0
+        # Bumped by every index write of this process and every change to ``shards``
+        self._write_generation = 0
+        self._index_generation = 0
+        self._create_lock = threading.Lock()
+        if self.index_name in self._worksheets:
+            index = self._worksheets[self.index_name]
+            self._apply_index(self.scheduler.call('get_values', index.get_values, INDEX_RANGE))
+
+    @property
+    def version(self):
+        """Changes whenever the data returned by recent_dataset() may have changed"""
+        # All counters only grow, so their sum changes whenever any of them does;
+        # the index generation covers summary(), which never reads a shard
+        return self._index_generation + sum(cache.version for cache in self._datasets.values())
+
+    def shard_key(self, tanggal):
+        date = parse_tanggal(tanggal)
+        if date is None:
+            return None
+        return f'{date.year:04d}' if self.shard_by == 'year' else f'{date.year:04d}-{date.month:02d}'
+
+    def shard_name(self, key):
+        return f'{self.sheet_name}_{key}'
+
+    def newest_first(self):
+        return sorted(self.shards.values(), key=lambda shard: shard.key, reverse=True)
+
+    def _apply_index(self, values):
+        prefix = f'{self.sheet_name}_'
+        for position, row in enumerate(values):
+            if not row or not row[0].startswith(prefix):
+                continue
+            key = row[0][len(prefix):]
+            # Local counts that are not written yet are newer than the sheet
+            if key in self._dirty:
+                continue
+            shard = ShardInfo.from_index_values(key, row, index_row=position + 2)
+            current = self.shards.get(key)
+            if (current is None or current.index_row != shard.index_row
+                    or current.index_values(row[0]) != shard.index_values(row[0])):
+                self.shards[key] = shard
+                self._index_generation += 1
+        self._index_loaded_at = time.monotonic()
+
+    def _maybe_refresh_index(self):
+        """Re-read the index in the background once it is older than the TTL"""
+        if time.monotonic() - self._index_loaded_at > self.ttl and self._index_task is None:
+            self._index_task = background_task(self._background_refresh_index())
+
+    async def _background_refresh_index(self):
+        try:
+            index = self._worksheets.get(self.index_name)
+            if index is None:
+                # Another process may have created the shards since we started
+                index = await self.scheduler.run(
+                    'open_worksheet', self.spreadsheet.worksheet, self.index_name, priority=PRIORITY_BACKGROUND
+                )
+                self._worksheets[self.index_name] = index
+            started = self._write_generation
+            values = await self.scheduler.run(
+                'get_values', index.get_values, INDEX_RANGE,
+                kind='read', priority=PRIORITY_BACKGROUND, key=('get_values', id(index), INDEX_RANGE)
+            )
+            if self._write_generation != started:
+                # Sent before one of our index writes landed, it may hold counts
+                # older than ours; the next refresh reads the index again
+                self._index_loaded_at = 0.0
+                return
+            self._apply_index(values)
+        except WorksheetNotFound:
+            self._index_loaded_at = time.monotonic()
+        except Exception as e:
+            logger.warning(f"Refreshing {self.index_name} failed: {e}")
+            self._index_loaded_at = time.monotonic()
+        finally:
+            self._index_task = None
+
+    def _mark_dirty(self, shard):
+        self._dirty.add(shard.key)
+        self._index_generation += 1
+        if self._flush_task is None:
+            self._flush_task = background_task(self._flush_index_later())
+
+    async def _flush_index_later(self):
+        try:
+            await asyncio.sleep(self.flush_delay)
+            await self.flush_index()
+        except Exception as e:
+            # Still dirty, the next append schedules another attempt
+            logger.warning(f"Updating {self.index_name} failed: {e}")
+        finally:
+            self._flush_task = None
+
+    async def flush_index(self, priority=PRIORITY_BACKGROUND):
+        """Write the index rows of shards that changed since the last flush"""
+        if not self._dirty:
+            return
+        index = self._worksheets[self.index_name]
+        written = {}
+        data = []
+        for key in self._dirty:
+            shard = self.shards[key]
+            written[key] = shard.index_values(self.shard_name(key))
+            data.append({
+                'range': f'A{shard.index_row}:N{shard.index_row}',
+                'values': [written[key]],
+            })
+        await self.scheduler.run('batch_update', index.batch_update, data, kind='write', priority=priority)
+        self._write_generation += 1
+        for key, values in written.items():
+            # Appends that landed during the write keep their shard dirty
+            if self.shards[key].index_values(self.shard_name(key)) == values:
+                self._dirty.discard(key)
+
+    def _create_worksheets(self, tables):
+        """Create the missing worksheets of ``{title: values}`` and write each one's values from A1.
+
+        All sheets are added in one batchUpdate and the values go out in
+        ``values.batchUpdate`` calls of at most WRITE_CHUNK rows, so even a
+        migration into dozens of shards costs only a few write requests.
+        """
+        missing = [title for title in tables if title not in self._worksheets]
+        if missing:
+            # Size each grid to its data, the default 1000x26 wastes the spreadsheet's cell budget
+            requests = [{'addSheet': {'properties': {'title': title, 'gridProperties': {
+                'rowCount': len(tables[title]), 'columnCount': len(tables[title][0])}}}} for title in missing]
+            self.scheduler.call('add_worksheets', self.spreadsheet.batch_update, {'requests': requests},
+                                kind='write', priority=PRIORITY_INTERACTIVE_WRITE)
+            worksheets = self.scheduler.call('worksheets', self.spreadsheet.worksheets)
+            self._worksheets = {sheet.title: sheet for sheet in worksheets}
+
+        data = []
+        pending = 0
+        for title, values in tables.items():
+            for start in range(0, len(values), WRITE_CHUNK):
+                chunk = values[start:start + WRITE_CHUNK]
+                data.append({'range': f"'{title}'!A{start + 1}", 'values': chunk})
+                pending += len(chunk)
+                if pending >= WRITE_CHUNK:
+                    self._write_values(data)
+                    data, pending = [], 0
+        if data:
+            self._write_values(data)
+
+    def _write_values(self, data):
+        self.scheduler.call('values_batch_update', self.spreadsheet.values_batch_update,
+                            {'valueInputOption': 'RAW', 'data': data},
+                            kind='write', priority=PRIORITY_INTERACTIVE_WRITE)
+
+    def _create_shard(self, key):
+        """Roll over to a new shard: create its worksheet and index row"""
+        with self._create_lock:
+            shard = self.shards.get(key)
+            if shard is not None:
+                return shard
+            name = self.shard_name(key)
+            tables = {title: [header] for title, header in ((self.index_name, INDEX_HEADER), (name, HEADER))
+                      if title not in self._worksheets}
+            if tables:
+                self._create_worksheets(tables)
+            index = self._worksheets[self.index_name]
+            index_row = max((shard.index_row for shard in self.shards.values()), default=1) + 1
+            shard = ShardInfo(key, index_row=index_row)
+            self.scheduler.call('append_row', index.append_row, shard.index_values(name),
+                                kind='write', priority=PRIORITY_INTERACTIVE_WRITE)
+            self.shards[key] = shard
+            self._write_generation += 1
+            self._index_generation += 1
+            logger.info(f"Started shard {name}")
+            return shard
+
+    async def _worksheet(self, name):
+        sheet = self._worksheets.get(name)
+        if sheet is None:
+            sheet = await self.scheduler.run('open_worksheet', self.spreadsheet.worksheet, name)
+            self._worksheets[name] = sheet
+        return sheet
+
+    async def _record_cache(self, shard):
+        name = self.shard_name(shard.key)
+        return get_record_cache(self.client, self.spreadsheet_id, name, self.ttl, worksheet=await self._worksheet(name))
+
+    async def _dataset_cache(self, shard):
+        cache = self._datasets.get(shard.key)
+        if cache is None:
+            name = self.shard_name(shard.key)
+            cache = get_dataset_cache(self.client, self.spreadsheet_id, name, self.ttl, worksheet=await self._worksheet(name))
+            self._datasets[shard.key] = cache
+        return cache
+
+    def prepare_writer(self):
+        """Move an existing single-worksheet history into shards and check the newest shard.
+
+        Called by the bot that appends rows, before it starts polling.
+        """
+        self.migrate_legacy()
+        self.reconcile(self.newest_first()[:1])
+
+    def migrate_legacy(self):
+        """Copy ``<sheet>`` into per-period shards, once, when no index exists yet.
+
+        The old worksheet is kept as ``<sheet>_arsip``; rows whose Tanggal
+        cannot be parsed stay only there.
+        """
+        legacy = self._worksheets.get(self.sheet_name)
+        if legacy is None or self.index_name in self._worksheets:
+            return
+        values = self.scheduler.call('get_all_values', legacy.get_all_values)
+        if not values or values[0][:len(HEADER)] != HEADER:
+            logger.warning(f"Not sharding {self.sheet_name}: unexpected header {values[:1]}")
+            return
+
+        groups = {}
+        skipped = 0
+        for row in values[1:]:
+            row = (list(row) + [''] * len(HEADER))[:len(HEADER)]
+            key = self.shard_key(row[1])
+            if key is None:
+                skipped += 1
+                continue
+            groups.setdefault(key, []).append(row)
+
+        self._create_worksheets({self.shard_name(key): [HEADER] + groups[key] for key in sorted(groups)})
+        shards = {
+            key: ShardInfo.from_values(key, [row[1:5] for row in groups[key]], index_row=position + 2)
+            for position, key in enumerate(sorted(groups))
+        }
+        # The index goes last: while it is missing a restart simply migrates again
+        self._create_worksheets({self.index_name: [INDEX_HEADER] + [
+            shards[key].index_values(self.shard_name(key)) for key in sorted(shards)
+        ]})
+        self.shards = shards
+        self._index_loaded_at = time.monotonic()
+        self._write_generation += 1
+        self._index_generation += 1
+        self.scheduler.call('update_title', legacy.update_title, f'{self.sheet_name}_arsip',
+                            kind='write', priority=PRIORITY_INTERACTIVE_WRITE)
+        logger.info(f"Moved {len(values) - 1 - skipped} rows of {self.sheet_name} into {len(shards)} shards "
+                    f"({skipped} rows with an invalid Tanggal kept only in {self.sheet_name}_arsip)")
+
+    def reconcile(self, shards):
+        """Recount shards from their rows, fixing index rows an unflushed update left behind"""
+        index = self._worksheets.get(self.index_name)
+        for shard in shards:
+            name = self.shard_name(shard.key)
+            sheet = self._worksheets.get(name)
+            if sheet is None or index is None:
+                continue
+            values = self.scheduler.call('get_values', sheet.get_values, DATA_RANGE)
+            counted = ShardInfo.from_values(shard.key, values, index_row=shard.index_row)
+            if counted.index_values(name) != shard.index_values(name):
+                logger.info(f"Index row of {name} was stale ({shard.rows} rows, counted {counted.rows})")
+                self.scheduler.call('update', index.update, [counted.index_values(name)],
+                                    f'A{shard.index_row}:N{shard.index_row}',
+                                    kind='write', priority=PRIORITY_INTERACTIVE_WRITE)
+                self.shards[shard.key] = counted
+                self._write_generation += 1
+                self._index_generation += 1
+
+    async def append_row(self, row_data):
+        """Append a row to the shard of its Tanggal, starting a new shard when needed"""
+        key = self.shard_key(row_data[1])
+        if key is None:
+            raise ValueError(f"Invalid Tanggal {row_data[1]!r}")
+        shard = self.shards.get(key)
+        if shard is None:
+            shard = await asyncio.to_thread(self._create_shard, key)
+        records = await self._record_cache(shard)
+        await records.append_row(row_data)
+        # An index refresh during the awaits may have replaced the ShardInfo; count on the current one
+        shard = self.shards.get(key, shard)
+        shard.add(row_data[1], row_data[3])
+        self._mark_dirty(shard)
+
+    async def get_records(self):
+        """Records of every shard, oldest shard first"""
+        return [record for part in await self.record_chunks() for record in part]
+
+    async def record_chunks(self, first=None, last=None):
+        """Record lists of the shards whose indexed date span overlaps ``first``..``last``, oldest first"""
+        self._maybe_refresh_index()
+        shards = [
+            shard for shard in reversed(self.newest_first())
+            if not (first and shard.last and shard.last < first) and not (last and shard.first and shard.first > last)
+        ]
+        caches = [await self._record_cache(shard) for shard in shards]
+        return list(await asyncio.gather(*(cache.get_records() for cache in caches)))
+
+    async def recent_dataset(self, limit):
+        """The newest ``limit`` rows, reading only as many shards as needed"""
+        self._maybe_refresh_index()
+        dataset = Dataset.from_values([])
+        for shard in self.newest_first():
+            if len(dataset) >= limit:
+                break
+            cache = await self._dataset_cache(shard)
+            dataset = Dataset.concat(dataset, (await cache.get_dataset()).head(limit - len(dataset)))
+        return dataset.head(limit)
+
+    async def summary(self):
+        """Row count and digit counts of the whole history, taken from the index"""
+        self._maybe_refresh_index()
+        shards = list(self.shards.values())
+        digits = np.sum([shard.digits for shard in shards], axis=0) if shards else np.zeros(10, dtype=np.int64)
+        firsts = [shard.first for shard in shards if shard.first]
+        lasts = [shard.last for shard in shards if shard.last]
+        return _summary(
+            sum(shard.rows for shard in shards), digits,
+            min(firsts) if firsts else None, max(lasts) if lasts else None, len(shards)
+        )
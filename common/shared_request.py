@@ -0,0 +1,23 @@
+from telegram.request import HTTPXRequest
+
+
+class SharedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest that can be handed to several Applications.
+
+    Every Bot initializes and shuts down its request object, so the
+    connection pool is only closed once the last Bot using it shuts down.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._users = 0
+
+    async def initialize(self):
+        self._users += 1
+        await super().initialize()
+
+    async def shutdown(self):
+        self._users -= 1
+        if self._users <= 0:
+            self._users = 0
+            await super().shutdown()
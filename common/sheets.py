@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+import time
+
+import gspread
+from gspread.utils import numericise_all
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+
+from common.metrics import background_task
+from common.scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE_READ,
+    PRIORITY_INTERACTIVE_WRITE,
+    get_scheduler,
+)
+
+logger = logging.getLogger(__name__)
+
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+# Clients and caches are shared per process, so bots running on the same
+# event loop reuse one authorised session and one copy of the sheet data.
+_clients = {}
+_caches = {}
+_append_listeners = {}
+_registry_lock = threading.Lock()
+
+
+def add_append_listener(spreadsheet_id, sheet_name, callback):
+    """Call ``callback(row_data)`` whenever a row is appended to a worksheet through its RecordCache"""
+    with _registry_lock:
+        _append_listeners.setdefault((spreadsheet_id, sheet_name), []).append(callback)
+
+
+def register_client(credentials_file, client):
+    """Use an already authorised client for a credentials file"""
+    key = os.path.abspath(credentials_file) if credentials_file else None
+    with _registry_lock:
+        _clients[key] = client
+
+
+def get_client(credentials_file):
+    """Return the authorised gspread client for a credentials file"""
+    key = os.path.abspath(credentials_file) if credentials_file else None
+    with _registry_lock:
+        client = _clients.get(key)
+        if client is None:
+            creds = Credentials.from_service_account_file(credentials_file, scopes=SCOPES)
+            client = gspread.authorize(creds)
+            # Keep enough pooled keep-alive connections for the scheduler workers
+            session = getattr(getattr(client, 'http_client', client), 'session', None)
+            if session is not None:
+                pool_size = get_scheduler().workers * 2
+                session.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+            _clients[key] = client
+        return client
+
+
+def get_record_cache(client, spreadsheet_id, sheet_name, ttl=None, worksheet=None):
+    """Return the shared record cache for a worksheet, opening it unless ``worksheet`` is given"""
+    key = (spreadsheet_id, sheet_name)
+    with _registry_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            sheet = worksheet or get_scheduler().call(
+                'open_worksheet', lambda: client.open_by_key(spreadsheet_id).worksheet(sheet_name)
+            )
+            cache = RecordCache(sheet, ttl=ttl, listeners=_append_listeners.setdefault(key, []))
+            _caches[key] = cache
+        return cache
+
+
+def find_record_cache(spreadsheet_id, sheet_name):
+    """Return the record cache of a worksheet when something in this process already uses one"""
+    with _registry_lock:
+        return _caches.get((spreadsheet_id, sheet_name))
+
+
+class RecordCache:
+    """In-memory copy of a worksheet's records.
+
+    The first read loads the sheet; afterwards reads are served from memory
+    and, once ``ttl`` seconds have passed, a background-priority refresh is
+    started while the current copy keeps being served. Rows appended through
+    the cache are added locally so writers never force a full reload.
+    ``version`` changes whenever the cached data changes.
+    """
+
+    def __init__(self, sheet, ttl=None, listeners=None):
+        self.sheet = sheet
+        self.ttl = ttl if ttl is not None else float(os.getenv('SHEET_CACHE_TTL', '60'))
+        self.version = 0
+        self.scheduler = get_scheduler()
+        self.listeners = listeners if listeners is not None else []
+        self._records = None
+        self._headers = None
+        self._loaded_at = 0.0
+        self._refresh_task = None
+
+    async def get_records(self):
+        """Return all records, loading them on first use"""
+        if self._records is None:
+            await self.refresh()
+        elif time.monotonic() - self._loaded_at > self.ttl and self._refresh_task is None:
+            self._refresh_task = background_task(self._background_refresh())
+        return self._records
+
+    async def _background_refresh(self):
+        try:
+            await self.refresh(priority=PRIORITY_BACKGROUND)
+        except Exception as e:
+            logger.warning(f"Background refresh of {self.sheet.title} failed: {e}")
+            # Back off for a full TTL before trying again
+            self._loaded_at = time.monotonic()
+        finally:
+            self._refresh_task = None
+
+    async def refresh(self, priority=PRIORITY_INTERACTIVE_READ):
+        """Reload all records from the sheet"""
+        records = await self.scheduler.run(
+            'get_all_records', self.sheet.get_all_records,
+            kind='read', priority=priority, key=('get_all_records', id(self.sheet))
+        )
+        if records:
+            headers = list(records[0].keys())
+        else:
+            headers = await self.scheduler.run(
+                'row_values', self.sheet.row_values, 1,
+                kind='read', priority=priority, key=('row_values', id(self.sheet))
+            )
+        self._headers = headers
+        self._records = records
+        self._loaded_at = time.monotonic()
+        self.version += 1
+        return records
+
+    async def append_row(self, row_data):
+        """Append a row to the sheet and to the cached records"""
+        await self.scheduler.run(
+            'append_row', self.sheet.append_row, row_data,
+            kind='write', priority=PRIORITY_INTERACTIVE_WRITE
+        )
+        if self._records is not None and self._headers:
+            # Mirror get_all_records() so cached and fresh rows compare equal
+            values = numericise_all([str(value) for value in row_data])
+            self._records.append(dict(zip(self._headers, values)))
+            self.version += 1
+        for listener in self.listeners:
+            listener(row_data)
+
+    def invalidate(self):
+        """Drop cached records so the next read goes to the sheet"""
+        self._records = None
+        self.version += 1
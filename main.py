@@ -1,15 +1,53 @@
 import subprocess
 import sys
 import os
+import asyncio
+import importlib.util
 from threading import Thread
 import time
 import signal
 from pathlib import Path
 
+from common.procstats import ProcessSampler, format_prometheus, start_metrics_server
+
+# Konfigurasi bot
+BOTS_CONFIG = [
+    {
+        'folder': 'bot1',
+        'filename': 'bot1.py',
+        'name': 'Data Input Bot',
+        'class': 'DataInputBot'
+    },
+    {
+        'folder': 'bot2', 
+        'filename': 'bot2.py',
+        'name': 'Togel Analysis Bot',
+        'class': 'TogelAnalysisBot'
+    }
+]
+
+# Bot yang berjalan minimal selama ini (detik) dianggap stabil: jeda restart kembali ke awal
+RESTART_STABLE_SECONDS = 300
+
 class BotManager:
-    def __init__(self):
+    def __init__(self, single_process=False):
         self.processes = []
         self.running = True
+        self.single_process = single_process
+        
+        # Status per bot untuk metrics: process aktif, waktu start dan jumlah restart
+        self.bot_states = {}
+        self.sampler = ProcessSampler()
+        self.samples = {}
+        self.active_alerts = set()
+        self.metrics_host = os.getenv('METRICS_HOST', '127.0.0.1')
+        self.metrics_port = int(os.getenv('METRICS_PORT', '9310'))
+        self.sample_interval = float(os.getenv('METRICS_SAMPLE_INTERVAL', '5'))
+        self.alert_thresholds = {
+            'rss_bytes': float(os.getenv('ALERT_RSS_MB', '512')) * 1024 * 1024,
+            'cpu_percent': float(os.getenv('ALERT_CPU_PERCENT', '90')),
+            'open_fds': float(os.getenv('ALERT_OPEN_FDS', '800')),
+        }
         
     def run_bot(self, bot_folder, bot_filename):
         """Menjalankan bot dalam folder terpisah"""
@@ -23,30 +61,59 @@ class BotManager:
                 print(f"❌ File bot tidak ditemukan: {bot_file}")
                 return
                 
-            print(f"🚀 Menjalankan bot dari: {bot_file}")
+            state = self.bot_states.setdefault(bot_folder, {'process': None, 'started_at': None, 'restarts': 0})
+            # Crash berturut-turut tanpa periode stabil, menentukan jeda restart
+            failures = 0
             
-            # Jalankan bot dengan Python
-            process = subprocess.Popen(
-                [sys.executable, bot_filename],
-                cwd=bot_path,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            self.processes.append(process)
-            
-            # Monitor output bot
-            while self.running and process.poll() is None:
-                try:
-                    # Baca output dengan timeout
-                    output = process.stdout.readline()
-                    if output:
-                        print(f"[{bot_folder}] {output.strip()}")
-                except Exception as e:
-                    print(f"[{bot_folder}] Error reading output: {e}")
-                    
-                time.sleep(0.1)
+            while self.running:
+                print(f"🚀 Menjalankan bot dari: {bot_file}")
+                
+                # Jalankan bot dengan Python (stderr digabung agar log bot ikut terbaca)
+                process = subprocess.Popen(
+                    [sys.executable, bot_filename],
+                    cwd=bot_path,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True
+                )
+                
+                # Ganti process lama milik bot ini, jangan menumpuk di daftar
+                if state['process'] in self.processes:
+                    self.processes[self.processes.index(state['process'])] = process
+                else:
+                    self.processes.append(process)
+                state['process'] = process
+                state['started_at'] = time.time()
+                
+                # Monitor output bot
+                while self.running and process.poll() is None:
+                    try:
+                        output = process.stdout.readline()
+                        if output:
+                            print(f"[{bot_folder}] {output.strip()}")
+                        else:
+                            time.sleep(0.1)
+                    except Exception as e:
+                        print(f"[{bot_folder}] Error reading output: {e}")
+                        time.sleep(0.1)
+                
+                if not self.running:
+                    break
+                
+                # Sisa output (biasanya traceback crash) lalu tutup pipe process lama
+                for output in process.stdout:
+                    print(f"[{bot_folder}] {output.strip()}")
+                process.stdout.close()
+                
+                # Bot berhenti sendiri: restart dengan jeda yang makin panjang
+                state['restarts'] += 1
+                if time.time() - state['started_at'] >= RESTART_STABLE_SECONDS:
+                    failures = 0
+                failures += 1
+                delay = min(60, 2 ** min(failures, 6))
+                print(f"⚠️  [{bot_folder}] berhenti (kode {process.returncode}), "
+                      f"restart ke-{state['restarts']} dalam {delay} detik")
+                time.sleep(delay)
                 
         except Exception as e:
             print(f"❌ Error menjalankan bot di {bot_folder}: {e}")
@@ -77,29 +144,93 @@ class BotManager:
         self.stop_all_bots()
         sys.exit(0)
     
-    def run(self):
-        """Menjalankan semua bot"""
-        # Setup signal handlers
-        signal.signal(signal.SIGINT, self.signal_handler)
-        signal.signal(signal.SIGTERM, self.signal_handler)
-        
-        # Konfigurasi bot
-        bots_config = [
-            {
-                'folder': 'bot1',
-                'filename': 'bot1.py',
-                'name': 'Data Input Bot'
-            },
-            {
-                'folder': 'bot2', 
-                'filename': 'bot2.py',
-                'name': 'Togel Analysis Bot'
-            }
-        ]
-        
-        # Periksa apakah semua folder dan file bot ada
+    def collect_samples(self):
+        """Mengambil sampel resource semua bot dari /proc dan memeriksa threshold"""
+        samples = {}
+        for bot_folder, state in list(self.bot_states.items()):
+            process = state['process']
+            if process is None:
+                continue
+            pid = process if isinstance(process, int) else process.pid
+            stats = self.sampler.sample(pid)
+            if stats is not None:
+                samples[bot_folder] = stats
+                self.check_alerts(bot_folder, stats)
+        self.samples = samples
+    
+    def check_alerts(self, bot_folder, stats):
+        """Menulis peringatan ke log saat resource bot melewati threshold"""
+        for key, limit in self.alert_thresholds.items():
+            value = stats.get(key)
+            if value is None:
+                continue
+            alert = (bot_folder, key)
+            if value > limit and alert not in self.active_alerts:
+                self.active_alerts.add(alert)
+                if key == 'rss_bytes':
+                    print(f"🚨 [{bot_folder}] Memory {value / 1024 / 1024:.0f} MB melewati batas {limit / 1024 / 1024:.0f} MB")
+                else:
+                    print(f"🚨 [{bot_folder}] {key} {value:.0f} melewati batas {limit:.0f}")
+            elif value <= limit * 0.9 and alert in self.active_alerts:
+                # Hysteresis 10% agar nilai di sekitar batas tidak membanjiri log
+                self.active_alerts.discard(alert)
+                print(f"✅ [{bot_folder}] {key} kembali normal")
+    
+    def monitor_resources(self):
+        """Loop sampling resource yang berjalan di thread terpisah"""
+        while self.running:
+            try:
+                self.collect_samples()
+            except Exception as e:
+                print(f"❌ Error sampling resource: {e}")
+            time.sleep(self.sample_interval)
+    
+    def render_metrics(self):
+        """Menyusun metrics semua bot dalam format Prometheus"""
+        now = time.time()
+        metrics = {
+            'bot_up': ('gauge', 'Whether the bot process is running', []),
+            'bot_uptime_seconds': ('gauge', 'Seconds since the bot process was started', []),
+            'bot_restarts_total': ('counter', 'Number of times the bot process was restarted', []),
+            'bot_cpu_seconds_total': ('counter', 'User and system CPU time of the bot process', []),
+            'bot_cpu_percent': ('gauge', 'CPU usage over the last sampling interval', []),
+            'bot_resident_memory_bytes': ('gauge', 'Resident set size of the bot process', []),
+            'bot_open_fds': ('gauge', 'Number of open file descriptors', []),
+            'bot_threads': ('gauge', 'Number of OS threads', []),
+        }
+        for bot_folder, state in list(self.bot_states.items()):
+            labels = {'bot': bot_folder}
+            stats = self.samples.get(bot_folder)
+            up = stats is not None
+            metrics['bot_up'][2].append((labels, int(up)))
+            metrics['bot_restarts_total'][2].append((labels, state['restarts']))
+            if not up:
+                continue
+            metrics['bot_uptime_seconds'][2].append((labels, round(now - state['started_at'], 1)))
+            metrics['bot_cpu_seconds_total'][2].append((labels, stats['cpu_seconds']))
+            metrics['bot_cpu_percent'][2].append((labels, round(stats['cpu_percent'], 2)))
+            metrics['bot_resident_memory_bytes'][2].append((labels, stats['rss_bytes']))
+            metrics['bot_open_fds'][2].append((labels, stats['open_fds']))
+            metrics['bot_threads'][2].append((labels, stats['threads']))
+        return format_prometheus(metrics)
+    
+    def start_monitoring(self):
+        """Menjalankan sampler resource dan endpoint metrics lokal"""
+        if not os.path.exists('/proc/self/stat'):
+            print("⚠️  /proc tidak tersedia, metrics resource dinonaktifkan")
+            return
+        Thread(target=self.monitor_resources, name="Thread-Metrics", daemon=True).start()
+        if self.metrics_port:
+            try:
+                start_metrics_server(self.metrics_host, self.metrics_port, self.render_metrics)
+                print(f"📈 Metrics tersedia di http://{self.metrics_host}:{self.metrics_port}/metrics")
+            except OSError as e:
+                print(f"❌ Gagal membuka endpoint metrics: {e}")
+    
+    def check_bots(self):
+        """Memeriksa apakah semua folder dan file bot ada"""
         missing_bots = []
-        for bot in bots_config:
+        for bot in BOTS_CONFIG:
             bot_path = os.path.join(bot['folder'], bot['filename'])
             if not os.path.exists(bot_path):
                 missing_bots.append(bot_path)
@@ -114,6 +245,106 @@ class BotManager:
             print("   │   └── bot1.py")
             print("   └── bot2/")
             print("       └── bot2.py")
+            return False
+        return True
+    
+    def load_bot_env(self, bot_folder):
+        """Menyusun environment untuk satu bot (os.environ + .env root + .env bot)"""
+        from dotenv import dotenv_values
+        
+        env = dict(os.environ)
+        env.update({k: v for k, v in dotenv_values('.env').items() if v is not None})
+        env.update({k: v for k, v in dotenv_values(os.path.join(bot_folder, '.env')).items() if v is not None})
+        
+        # Path credentials relatif terhadap folder bot, sama seperti mode subprocess
+        credentials_file = env.get('GOOGLE_CREDENTIALS_FILE')
+        if credentials_file and not os.path.isabs(credentials_file):
+            bot_relative = os.path.join(os.path.abspath(bot_folder), credentials_file)
+            if os.path.exists(bot_relative):
+                env['GOOGLE_CREDENTIALS_FILE'] = bot_relative
+        return env
+    
+    def load_bot_class(self, bot):
+        """Mengimpor modul bot dari file-nya dan mengembalikan class bot"""
+        bot_file = os.path.abspath(os.path.join(bot['folder'], bot['filename']))
+        module_name = f"{bot['folder']}_app"
+        spec = importlib.util.spec_from_file_location(module_name, bot_file)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        return getattr(module, bot['class'])
+    
+    def run_single_process(self):
+        """Menjalankan semua bot sebagai beberapa Application dalam satu event loop"""
+        print("🤖 Bot Manager - Mode single-process")
+        print("=" * 50)
+        
+        # Kedua bot memakai satu client gspread, satu cache data dan satu pool HTTP
+        applications = []
+        for bot in BOTS_CONFIG:
+            print(f"🔄 Mempersiapkan {bot['name']}...")
+            bot_class = self.load_bot_class(bot)
+            instance = bot_class(env=self.load_bot_env(bot['folder']))
+            applications.append((bot['name'], instance))
+        
+        # Semua bot berada di proses ini, jadi metrics diambil dari pid sendiri
+        self.bot_states['all'] = {'process': os.getpid(), 'started_at': time.time(), 'restarts': 0}
+        self.start_monitoring()
+        
+        asyncio.run(self.serve_applications(applications))
+        self.running = False
+        print("🏁 Semua bot telah dihentikan. Selamat tinggal!")
+    
+    async def serve_applications(self, bots):
+        """Menjalankan polling semua Application sampai menerima signal stop"""
+        from telegram import Update
+        from common.shared_request import SharedHTTPXRequest
+        
+        request = SharedHTTPXRequest()
+        applications = [(name, bot.build_application(request=request)) for name, bot in bots]
+        
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        
+        started = []
+        try:
+            for name, application in applications:
+                await application.initialize()
+                # run_polling() would call post_init here; it is not used in this mode
+                if application.post_init:
+                    await application.post_init(application)
+                await application.start()
+                await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+                started.append(application)
+                print(f"✅ {name} berjalan")
+            
+            print("=" * 50)
+            print("📝 Tekan Ctrl+C untuk menghentikan semua bot")
+            print("=" * 50)
+            await stop_event.wait()
+        finally:
+            print("\n🛑 Menghentikan semua bot...")
+            for application in reversed(started):
+                try:
+                    await application.updater.stop()
+                    await application.stop()
+                    await application.shutdown()
+                except Exception as e:
+                    print(f"❌ Error menghentikan bot: {e}")
+    
+    def run(self):
+        """Menjalankan semua bot"""
+        # Setup signal handlers
+        signal.signal(signal.SIGINT, self.signal_handler)
+        signal.signal(signal.SIGTERM, self.signal_handler)
+        
+        if not self.check_bots():
+            return
+        
+        if self.single_process:
+            self.run_single_process()
             return
         
         print("🤖 Bot Manager - Memulai semua bot...")
@@ -121,7 +352,7 @@ class BotManager:
         
         # Buat dan jalankan thread untuk setiap bot
         threads = []
-        for bot in bots_config:
+        for bot in BOTS_CONFIG:
             print(f"🔄 Mempersiapkan {bot['name']}...")
             thread = Thread(
                 target=self.run_bot,
@@ -133,6 +364,8 @@ class BotManager:
             thread.start()
             time.sleep(2)  # Delay antar bot untuk menghindari konflik
         
+        self.start_monitoring()
+        
         print("=" * 50)
         print("✅ Semua bot telah dimulai!")
         print("📝 Tekan Ctrl+C untuk menghentikan semua bot")
@@ -182,8 +415,9 @@ def main():
             print("   untuk TELEGRAM_BOT_TOKEN dan GOOGLE_SPREADSHEET_ID")
             print()
         
-        # Jalankan bot manager
-        bot_manager = BotManager()
+        # Jalankan bot manager (--single-process atau BOT_MODE=single untuk satu event loop)
+        single_process = '--single-process' in sys.argv[1:] or os.getenv('BOT_MODE') == 'single'
+        bot_manager = BotManager(single_process=single_process)
         bot_manager.run()
         
     except Exception as e:
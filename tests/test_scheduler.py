@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.scheduler import PRIORITY_INTERACTIVE_READ, PRIORITY_INTERACTIVE_WRITE, SheetsScheduler
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_read_runs_while_writes_wait_for_quota(self):
+        scheduler = SheetsScheduler(read_quota=10, write_quota=2, workers=2)
+        writes = [
+            scheduler.submit('append_row', lambda: 'written', kind='write', priority=PRIORITY_INTERACTIVE_WRITE)
+            for _ in range(3)
+        ]
+        read = scheduler.submit('get_values', lambda: 'read', kind='read', priority=PRIORITY_INTERACTIVE_READ)
+
+        start = time.monotonic()
+        self.assertEqual(read.result(timeout=5), 'read')
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual([future.result(timeout=1) for future in writes[:2]], ['written', 'written'])
+        # The third write has to wait for the one-minute window
+        self.assertFalse(writes[2].done())
+
+    def test_retry_backoff_does_not_block_workers(self):
+        scheduler = SheetsScheduler(workers=1, max_retries=1)
+        attempts = []
+        retried = threading.Event()
+
+        def flaky_read():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise requests.ConnectionError('connection reset')
+            retried.set()
+            return 'read'
+
+        # Backoff of 0.5 s, long enough to see whether the only worker sleeps through it
+        with mock.patch('common.scheduler.random.uniform', return_value=0.5):
+            read = scheduler.submit('get_values', flaky_read, kind='read')
+            time.sleep(0.1)
+            write = scheduler.submit('append_row', lambda: 'written', kind='write',
+                                     priority=PRIORITY_INTERACTIVE_WRITE)
+            self.assertEqual(write.result(timeout=0.3), 'written')
+            self.assertFalse(retried.is_set())
+
+        self.assertEqual(read.result(timeout=5), 'read')
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.45)
+
+    def test_write_is_not_retried_after_read_timeout(self):
+        scheduler = SheetsScheduler(workers=1, max_retries=3)
+        calls = []
+
+        def append():
+            calls.append(1)
+            raise requests.ReadTimeout('response lost')
+
+        future = scheduler.submit('append_row', append, kind='write', priority=PRIORITY_INTERACTIVE_WRITE)
+        with self.assertRaises(requests.ReadTimeout):
+            future.result(timeout=5)
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()